@@ -1,7 +1,7 @@
 ADDI R1, R0, 0
 ADDI R3, R0, 0
-loop:
 ADDI R4, R0, 4
+loop:
 LW R5, 0(R1)
 ADD R3, R3, R5
 ADDI R1, R1, 1
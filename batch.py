@@ -0,0 +1,182 @@
+# Пакетный эмулятор: одна программа исполняется одновременно на многих наборах
+# данных ("дорожках"). Регистры и память всех дорожек хранятся в массивах NumPy,
+# каждая команда выполняется векторно для всех дорожек с одинаковым pc.
+# Дорожки, разошедшиеся на BEQ/BNE, перегруппировываются по pc на каждом шаге.
+# Результат каждой дорожки совпадает с EmulatorMIPS, созданным с тем же
+# размером памяти данных.
+
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from processor import (EmulatorMIPS, HALT_END, HALT_FAULT, HALT_MAX_STEPS, HALT_MAX_TIME, HALT_STOP)
+
+# Состояния дорожек
+RUNNING = 0
+_REASONS = (None, HALT_STOP, HALT_END, HALT_FAULT, HALT_MAX_STEPS, HALT_MAX_TIME)
+_STATUS = {reason: code for code, reason in enumerate(_REASONS) if reason is not None}
+
+_MIN = -0x80000000
+_MAX = 0x7FFFFFFF
+
+
+# Результат пакетного выполнения: по значению на дорожку
+@dataclass
+class BatchResult:
+    reasons: list
+    steps: np.ndarray
+    pcs: np.ndarray
+    fault_addresses: np.ndarray  # -1 для дорожек без ошибки
+
+
+# Приведение int64 к 32-битному знаковому слову
+def _wrap(values):
+    return (((values + 0x80000000) & 0xFFFFFFFF) - 0x80000000).astype(np.int32)
+
+
+class BatchEmulatorMIPS:
+    def __init__(self, lanes, instruction_words=256, data_words=1024):
+        self.lanes = lanes
+        self.data_words = data_words
+        self.registers = np.zeros((lanes, 32), dtype=np.int32)
+        self.data_memory = np.zeros((lanes, data_words), dtype=np.int32)
+        self.pc = np.zeros(lanes, dtype=np.int64)
+        self.steps = np.zeros(lanes, dtype=np.int64)
+        self.status = np.zeros(lanes, dtype=np.int8)
+        self.fault_address = np.full(lanes, -1, dtype=np.int64)
+        # Декодирование выполняет скалярный эмулятор, чтобы семантика команд совпадала
+        self._decoder = EmulatorMIPS(instruction_words=instruction_words, data_words=1)
+        self._decoded = self._decoder._decoded
+
+    # Загрузка программы и сброс состояния всех дорожек
+    def load_program(self, program):
+        self._decoder.load_program(program)
+        self._decoded = self._decoder._decoded
+        self.registers.fill(0)
+        self.pc.fill(0)
+        self.steps.fill(0)
+        self.status.fill(RUNNING)
+        self.fault_address.fill(-1)
+
+    # Запись данных в память: data формы (lanes, n) или (n,) для всех дорожек
+    def load_data(self, data, offset=0):
+        data = np.asarray(data, dtype=np.int32)
+        n = data.shape[-1]
+        if offset < 0 or offset + n > self.data_words:
+            raise IndexError("Данные выходят за пределы памяти данных")
+        self.data_memory[:, offset:offset + n] = data
+
+    def run_until_halt(self, max_steps=None, max_time=None):
+        limit = sys.maxsize if max_steps is None else max_steps
+        deadline = None if max_time is None else time.perf_counter() + max_time
+        size = len(self._decoded) - 1
+        # Дорожки, остановленные лимитами, продолжают выполнение; счётчик шагов
+        # считается заново для каждого вызова, как в EmulatorMIPS.run_until_halt
+        resumed = (self.status == _STATUS[HALT_MAX_STEPS]) | (self.status == _STATUS[HALT_MAX_TIME])
+        self.status[resumed] = RUNNING
+        self.steps[self.status == RUNNING] = 0
+        out_of_range = (self.pc < 0) | (self.pc >= size)
+        self.status[(self.status == RUNNING) & out_of_range] = _STATUS[HALT_END]
+        self.pc[out_of_range] = size
+
+        rounds = 0
+        while True:
+            active = np.flatnonzero(self.status == RUNNING)
+            if active.size == 0:
+                break
+            # Все работающие дорожки делают по шагу за раунд
+            if rounds >= limit:
+                self.status[active] = _STATUS[HALT_MAX_STEPS]
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.status[active] = _STATUS[HALT_MAX_TIME]
+                break
+            pcs = self.pc[active]
+            first = pcs[0]
+            if (pcs == first).all():
+                self._execute(int(first), active)
+            else:
+                order = np.argsort(pcs, kind="stable")
+                pcs = pcs[order]
+                bounds = np.flatnonzero(np.diff(pcs)) + 1
+                for group in np.split(active[order], bounds):
+                    self._execute(int(self.pc[group[0]]), group)
+            rounds += 1
+        return self.result()
+
+    def result(self):
+        return BatchResult([_REASONS[code] for code in self.status], self.steps.copy(),
+                           self.pc.copy(), self.fault_address.copy())
+
+    # Выполнение команды по адресу pc для дорожек lanes
+    def _execute(self, pc, lanes):
+        entry = self._decoded[pc]
+        name, rs, rt, rd, imm = entry.name, entry.rs, entry.rt, entry.rd, entry.imm
+        regs = self.registers
+        next_pc = pc + 1
+
+        if name == "END":
+            self.status[lanes] = _STATUS[HALT_END]
+            return
+        if name == "STOP":
+            self.status[lanes] = _STATUS[HALT_STOP]
+            self.pc[lanes] = next_pc
+            return
+        if name == "?":
+            # Неизвестная команда: та же ошибка, что и в скалярном эмуляторе
+            entry.handler(self._decoder, rs, rt, rd, imm)
+
+        if name in ("BEQ", "BNE"):
+            equal = regs[lanes, rs] == regs[lanes, rt]
+            taken = equal if name == "BEQ" else ~equal
+            self.pc[lanes] = np.where(taken, imm, next_pc)
+            self.steps[lanes] += 1
+            return
+        if name == "J":
+            self.pc[lanes] = imm
+            self.steps[lanes] += 1
+            return
+
+        if name in ("LW", "SW"):
+            address = regs[lanes, rs].astype(np.int64) + imm
+            valid = (address >= 0) & (address < self.data_words)
+            if not valid.all():
+                faulted = lanes[~valid]
+                self.status[faulted] = _STATUS[HALT_FAULT]
+                self.fault_address[faulted] = address[~valid]
+                self.pc[faulted] = next_pc
+                lanes = lanes[valid]
+                address = address[valid]
+            if name == "LW":
+                regs[lanes, rt] = self.data_memory[lanes, address]
+            else:
+                self.data_memory[lanes, address] = regs[lanes, rt]
+        elif name != "NOP":
+            a = regs[lanes, rs].astype(np.int64)
+            if name in ("ADDI", "ADDIU", "ANDI", "ORI", "XORI"):
+                target = rt
+                b = imm
+            else:
+                target = rd
+                b = regs[lanes, rt].astype(np.int64)
+            if name in ("ADD", "SUB", "ADDI"):
+                # Переполнение: запись результата пропускается, как в EmulatorMIPS
+                res = a - b if name == "SUB" else a + b
+                ok = (res >= _MIN) & (res <= _MAX)
+                regs[lanes[ok], target] = res[ok]
+            elif name in ("ADDU", "ADDIU"):
+                regs[lanes, target] = _wrap(a + b)
+            elif name == "SUBU":
+                regs[lanes, target] = _wrap(a - b)
+            elif name in ("AND", "ANDI"):
+                regs[lanes, target] = a & b
+            elif name in ("OR", "ORI"):
+                regs[lanes, target] = a | b
+            elif name in ("XOR", "XORI"):
+                regs[lanes, target] = a ^ b
+            elif name == "NOR":
+                regs[lanes, target] = ~(a | b)
+        self.pc[lanes] = next_pc
+        self.steps[lanes] += 1
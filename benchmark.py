@@ -0,0 +1,262 @@
+# Воспроизводимый набор тестов производительности эмулятора и ассемблера.
+#
+# Нагрузки генерируются параметрически и детерминированно (фиксированное
+# зерно), поэтому результаты разных запусков сравнимы. Для каждой нагрузки
+# измеряется число команд в секунду в режимах run_until_halt и run_compiled,
+# пиковая память (tracemalloc) — отдельным прогоном, чтобы не искажать время.
+# Для ассемблера — строки в секунду без кэша и с тёплым кэшем объектного кода.
+#
+# Примеры:
+#   python benchmark.py --save baseline.json
+#   python benchmark.py --baseline baseline.json --threshold 0.1
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+from disassembler import DisassemblerMIPS
+from processor import EmulatorMIPS
+
+RESULTS_VERSION = 2
+
+
+# Загрузка 32-битной константы в регистр: ADDI принимает только 16-битное
+# значение, поэтому старшая часть собирается удвоениями
+def load_constant(register, value):
+    high, low = divmod(value, 1024)
+    if high == 0:
+        return [f"ADDI {register}, R0, {low}"]
+    return ([f"ADDI {register}, R0, {high}"] + [f"ADD {register}, {register}, {register}"] * 10
+            + [f"ADDI {register}, {register}, {low}"])
+
+
+# Длинный арифметический цикл: восемь команд АЛУ на итерацию
+def arithmetic_program(iterations):
+    return "\n".join(load_constant("R1", iterations) + [
+        "ADDI R2, R0, 3",
+        "ADDI R3, R0, 0",
+        "loop:",
+        "ADD R3, R3, R2",
+        "XOR R4, R3, R1",
+        "ADDU R5, R5, R4",
+        "AND R6, R5, R2",
+        "OR R7, R6, R4",
+        "SUBU R8, R7, R3",
+        "NOR R9, R8, R2",
+        "ADDI R1, R1, -1",
+        "BNE R1, R0, loop",
+    ])
+
+
+# Потоковое суммирование всей памяти данных размером words слов
+def memory_program(words):
+    return "\n".join(load_constant("R2", words) + [
+        "ADDI R1, R0, 0",
+        "loop:",
+        "LW R4, 0(R1)",
+        "ADDU R3, R3, R4",
+        "ADDI R1, R1, 1",
+        "BNE R1, R2, loop",
+    ])
+
+
+# Код с частыми переходами: выполнение условных переходов зависит от счётчика
+def branch_program(iterations):
+    return "\n".join(load_constant("R1", iterations) + [
+        "ADDI R6, R0, 0",
+        "loop:",
+        "ANDI R2, R1, 1",
+        "BEQ R2, R0, even",
+        "ADDI R6, R6, 1",
+        "even:",
+        "ANDI R3, R1, 2",
+        "BNE R3, R0, odd_pair",
+        "ADDI R7, R7, 1",
+        "odd_pair:",
+        "ANDI R4, R1, 4",
+        "BEQ R4, R6, same",
+        "ADDI R8, R8, 1",
+        "same:",
+        "ADDI R1, R1, -1",
+        "BNE R1, R0, loop",
+    ])
+
+
+# Большая сгенерированная программа для ассемблера: разнообразные команды
+# с меткой через каждые 50 строк и переходами на ближайшие метки
+def assembler_program(lines, seed=1):
+    rng = random.Random(seed)
+    r_format = ("ADD", "ADDU", "SUB", "SUBU", "AND", "OR", "XOR", "NOR")
+    i_format = ("ADDI", "ADDIU", "ANDI", "ORI", "XORI")
+    result = []
+    for number in range(lines):
+        if number % 50 == 0:
+            result.append(f"label{number // 50}:")
+            continue
+        kind = rng.random()
+        if kind < 0.4:
+            result.append(f"{rng.choice(r_format)} R{rng.randrange(32)}, R{rng.randrange(32)}, R{rng.randrange(32)}")
+        elif kind < 0.7:
+            result.append(f"{rng.choice(i_format)} R{rng.randrange(32)}, R{rng.randrange(32)}, "
+                          f"{rng.randrange(-32768, 32768)}")
+        elif kind < 0.9:
+            result.append(f"{rng.choice(('LW', 'SW'))} R{rng.randrange(32)}, {rng.randrange(1024)}(R{rng.randrange(32)})")
+        else:
+            target = max(0, number // 50 + rng.randrange(-2, 3))
+            target = min(target, (lines - 1) // 50)
+            result.append(f"{rng.choice(('BEQ', 'BNE'))} R{rng.randrange(32)}, R{rng.randrange(32)}, label{target}")
+    return "\n".join(result)
+
+
+# Лучшее время из repeat запусков; setup() готовит аргумент и не измеряется
+def best_time(function, setup, repeat):
+    best = None
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        value = function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+
+def _metric(value, unit, higher_is_better=True):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+# Нагрузка для эмулятора: скорость в каждом режиме и пиковая память
+def bench_emulator(name, source, repeat, data_words=1024, data=None):
+    program = DisassemblerMIPS().disassemble(source)
+
+    def setup():
+        emulator = EmulatorMIPS(data_words=data_words)
+        emulator.load_program(program)
+        if data is not None:
+            emulator.load_data(data)
+        return emulator
+
+    results = {}
+    steps = None
+    for mode in ("run_until_halt", "run_compiled"):
+        elapsed, result = best_time(lambda emulator: getattr(emulator, mode)(), setup, repeat)
+        if steps is not None and result.steps != steps:
+            raise RuntimeError(f"{name}: режимы выполнили разное число команд")
+        steps = result.steps
+        results[f"{name}.{mode}"] = _metric(steps / elapsed, "instr/s")
+    tracemalloc.start()
+    setup().run_until_halt()
+    results[f"{name}.peak_memory"] = _metric(tracemalloc.get_traced_memory()[1], "bytes", False)
+    tracemalloc.stop()
+    results[f"{name}.instructions"] = _metric(steps, "instr", None)
+    return results
+
+
+# Скорость ассемблера: без кэша и с тёплым кэшем объектного кода
+def bench_assembler(lines, repeat):
+    source = assembler_program(lines)
+    elapsed, _ = best_time(DisassemblerMIPS().disassemble, lambda: source, repeat)
+    results = {"assembler.cold": _metric(lines / elapsed, "lines/s")}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        DisassemblerMIPS().assemble_cached(source, cache_dir)
+        elapsed, _ = best_time(lambda text: DisassemblerMIPS().assemble_cached(text, cache_dir),
+                               lambda: source, repeat)
+    results["assembler.cached"] = _metric(lines / elapsed, "lines/s")
+    tracemalloc.start()
+    DisassemblerMIPS().assemble(source)
+    results["assembler.peak_memory"] = _metric(tracemalloc.get_traced_memory()[1], "bytes", False)
+    tracemalloc.stop()
+    return results
+
+
+# Время запуска: новый интерпретатор, импорт модулей и создание эмулятора
+def bench_startup(repeat):
+    code = "import processor, disassembler; processor.EmulatorMIPS(); disassembler.DisassemblerMIPS()"
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def start(_):
+        subprocess.run([sys.executable, "-c", code], cwd=directory, check=True)
+
+    elapsed, _ = best_time(start, lambda: None, repeat)
+    return {"startup": _metric(elapsed, "s", False)}
+
+
+def run_suite(scale=1.0, repeat=3):
+    iterations = max(1, int(100_000 * scale))
+    words = max(1, int((1 << 18) * scale))
+    results = {}
+    results.update(bench_emulator("arithmetic", arithmetic_program(iterations), repeat))
+    results.update(bench_emulator("memory_stream", memory_program(words), repeat, data_words=words,
+                                  data=array("i", range(words))))
+    results.update(bench_emulator("branches", branch_program(iterations), repeat))
+    results.update(bench_assembler(max(50, int(100_000 * scale)), repeat))
+    results.update(bench_startup(repeat))
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "results": results,
+    }
+
+
+# Сравнение с базовой линией: метрики, ухудшившиеся больше чем на threshold
+def compare(current, baseline, threshold):
+    regressions = []
+    lines = []
+    for name, metric in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or metric["higher_is_better"] is None or not base["value"]:
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        worse = -change if metric["higher_is_better"] else change
+        mark = ""
+        if worse > threshold:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(name)
+        lines.append(f"{name:32} {base['value']:>14.4g} -> {metric['value']:>14.4g} {metric['unit']:8} "
+                     f"{100 * change:+7.1f}%{mark}")
+    return regressions, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Тесты производительности эмулятора MIPS")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель размера нагрузок")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов (берётся лучшее время)")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON базовой линии для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="допустимое ухудшение относительно базовой линии (доля)")
+    args = parser.parse_args(argv)
+
+    current = run_suite(args.scale, args.repeat)
+    for name, metric in current["results"].items():
+        print(f"{name:32} {metric['value']:>14.4g} {metric['unit']}")
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(current, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("version") != current["version"]:
+            print("Внимание: базовая линия получена другой версией набора нагрузок", file=sys.stderr)
+        if baseline.get("scale") != current["scale"]:
+            print("Внимание: масштаб нагрузок отличается от базовой линии", file=sys.stderr)
+        regressions, lines = compare(current, baseline, args.threshold)
+        print()
+        print("\n".join(lines))
+        if regressions:
+            print(f"\nРегрессии: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
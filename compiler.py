@@ -0,0 +1,220 @@
+# Компиляция базовых блоков программы MIPS в функции Python.
+#
+# Блок — последовательность команд от точки входа до перехода, команды STOP,
+# начала другого блока, команды, которую компилятор не поддерживает, или
+# ловушки отладчика.
+# Регистры внутри блока хранятся в локальных переменных и записываются
+# обратно в регистровый файл только при выходе из блока.
+
+from instructions import WRITES_RD
+
+# Адрес, который блок возвращает при встрече команды STOP
+STOP = -1
+
+# Границы 32-битного знакового машинного слова
+WORD_MIN = -0x80000000
+WORD_MAX = 0x7FFFFFFF
+
+# Ограничение длины блока, чтобы сгенерированный код оставался небольшим
+MAX_BLOCK_LENGTH = 256
+
+_BRANCHES = ("J", "BEQ", "BNE")
+# Команды, для которых есть генерация кода в _emit
+COMPILABLE = ("ADD", "ADDU", "SUB", "SUBU", "AND", "OR", "XOR", "NOR",
+              "ADDI", "ADDIU", "ANDI", "ORI", "XORI", "LW", "SW") + _BRANCHES + ("NOP", "STOP")
+
+
+class CompiledBlock:
+    def __init__(self, function, start, end, source):
+        # function(emulator, registers, memory, budget) -> (pc, steps);
+        # budget — сколько шагов блоку разрешено выполнить (не меньше длины блока)
+        self.function = function
+        self.start = start
+        self.end = end  # адрес за последней командой блока
+        self.length = end - start
+        self.source = source
+
+
+class BlockCompiler:
+    def __init__(self, emulator, logger):
+        self.emulator = emulator
+        self.logger = logger
+        self.blocks = {}  # адрес входа -> CompiledBlock
+        self.fault_steps = 0  # команды, выполненные блоком до ошибки обращения к памяти
+        self._leaders = None
+
+    # Сброс всех блоков (например, после загрузки новой программы)
+    def reset(self):
+        self.blocks.clear()
+        self._leaders = None
+
+    # Удаление блоков, содержащих изменённый адрес памяти команд
+    def invalidate(self, address):
+        for start in [s for s, b in self.blocks.items() if b.start <= address < b.end]:
+            del self.blocks[start]
+        self._leaders = None
+
+    # Возвращает блок для адреса pc или None, если команда не компилируется
+    def get(self, pc):
+        block = self.blocks.get(pc)
+        if block is None:
+            block = self.compile(pc)
+            if block is not None:
+                self.blocks[pc] = block
+        return block
+
+    # Начала блоков: цели переходов и команды сразу за переходами
+    def leaders(self):
+        if self._leaders is None:
+            leaders = set()
+            for address, entry in enumerate(self.emulator._decoded[:-1]):
+                if entry.name in _BRANCHES:
+                    leaders.add(entry.imm)
+                    leaders.add(address + 1)
+            self._leaders = leaders
+        return self._leaders
+
+    def compile(self, start):
+        decoded = self.emulator._decoded
+        size = len(decoded) - 1
+        if not 0 <= start < size or decoded[start].name not in COMPILABLE:
+            return None
+        # Команды с ловушками отладчика выполняются только пошагово
+        debugger = self.emulator.debugger
+        traps = debugger.traps if debugger is not None else ()
+        if start in traps:
+            return None
+        leaders = self.leaders()
+
+        body = []
+        used = set()
+        written = set()
+        pc = start
+        terminator = None
+        while pc < size and pc - start < MAX_BLOCK_LENGTH:
+            if pc != start and pc in leaders:
+                break
+            entry = decoded[pc]
+            if entry.name not in COMPILABLE or pc in traps:
+                break
+            pc += 1
+            if entry.name in _BRANCHES or entry.name == "STOP":
+                terminator = entry
+                break
+            self._emit(body, entry, pc - 1, used, written)
+        end = pc
+        length = end - start
+
+        # Блок, переходящий на своё начало, исполняется циклом внутри функции,
+        # пока не исчерпан переданный ему лимит шагов
+        loop = terminator is not None and terminator.name != "STOP" and terminator.imm == start
+        if terminator is None:
+            body.append(f"return {end}, {length}")
+        elif terminator.name == "STOP":
+            body.append(f"return {STOP}, {length - 1}")
+        else:
+            if terminator.name == "J":
+                condition = "True"
+            else:
+                used.update((terminator.rs, terminator.rt))
+                op = "==" if terminator.name == "BEQ" else "!="
+                condition = f"r{terminator.rs} {op} r{terminator.rt}"
+            if loop:
+                body.append(f"steps += {length}")
+                body.append(f"if {condition}:")
+                body.append(f"    if steps + {length} <= budget:")
+                body.append("        continue")
+                body.append(f"    return {start}, steps")
+                body.append(f"return {end}, steps")
+            else:
+                body.append(f"if {condition}:")
+                body.append(f"    return {terminator.imm}, {length}")
+                body.append(f"return {end}, {length}")
+
+        name = f"block_{start}"
+        lines = [f"def {name}(emulator, regs, mem, budget):"]
+        lines += [f"    r{n} = regs[{n}]" for n in sorted(used | written)]
+        if any(line.startswith("at = ") for line in body):
+            lines.append("    load = mem.load")
+            lines.append("    store = mem.store")
+        lines.append(f"    at = {start}")
+        lines.append("    try:")
+        if loop:
+            lines.append("        steps = 0")
+            lines.append("        while True:")
+            lines += ["            " + line for line in body]
+        else:
+            lines += ["        " + line for line in body]
+        lines.append("    except BaseException:")
+        lines.append("        emulator.pc = at + 1")
+        done = f"steps + at - {start}" if loop else f"at - {start}"
+        lines.append(f"        compiler.fault_steps = {done}")
+        lines.append("        raise")
+        if written:
+            lines.append("    finally:")
+            lines += [f"        regs[{n}] = r{n}" for n in sorted(written)]
+        source = "\n".join(lines) + "\n"
+        namespace = {"warn": self.logger.warning, "compiler": self}
+        exec(compile(source, f"<{name}>", "exec"), namespace)
+        return CompiledBlock(namespace[name], start, end, source)
+
+    # Генерация кода одной команды, не завершающей блок
+    def _emit(self, body, entry, pc, used, written):
+        name, rs, rt, rd, imm = entry.name, entry.rs, entry.rt, entry.rd, entry.imm
+        s, t, d = f"r{rs}", f"r{rt}", f"r{rd}"
+        if name == "NOP":
+            return
+
+        if name in WRITES_RD:
+            used.update((rs, rt))
+            written.add(rd)
+            if name in ("ADD", "SUB"):
+                op = "+" if name == "ADD" else "-"
+                body.append(f"res = {s} {op} {t}")
+                body.append(f"if {WORD_MIN} <= res <= {WORD_MAX}:")
+                body.append(f"    {d} = res")
+                body.append("else:")
+                body.append(f"    warn('Overflow detected in {name} operation')")
+            elif name == "ADDU":
+                body.append(f"{d} = (({s} + {t} + 0x80000000) & 0xFFFFFFFF) - 0x80000000")
+            elif name == "SUBU":
+                body.append(f"{d} = (({s} - {t} + 0x80000000) & 0xFFFFFFFF) - 0x80000000")
+            elif name == "AND":
+                body.append(f"{d} = {s} & {t}")
+            elif name == "OR":
+                body.append(f"{d} = {s} | {t}")
+            elif name == "XOR":
+                body.append(f"{d} = {s} ^ {t}")
+            elif name == "NOR":
+                body.append(f"{d} = ~({s} | {t})")
+            return
+
+        used.add(rs)
+        if name == "SW":
+            used.add(rt)
+            body.append(f"at = {pc}")
+            body.append(f"store({s} + {imm}, {t})")
+            return
+        written.add(rt)
+        if name == "LW":
+            body.append(f"at = {pc}")
+            body.append(f"{t} = load({s} + {imm})")
+        elif name == "ADDI":
+            # Знак imm известен при компиляции, поэтому проверка переполнения упрощается
+            if imm == 0:
+                body.append(f"{t} = {s}")
+            else:
+                condition = f"res <= {WORD_MAX}" if imm > 0 else f"res >= {WORD_MIN}"
+                body.append(f"res = {s} + {imm}")
+                body.append(f"if {condition}:")
+                body.append(f"    {t} = res")
+                body.append("else:")
+                body.append("    warn('Overflow detected in ADDI operation')")
+        elif name == "ADDIU":
+            body.append(f"{t} = (({s} + {imm} + 0x80000000) & 0xFFFFFFFF) - 0x80000000")
+        elif name == "ANDI":
+            body.append(f"{t} = {s} & {imm}")
+        elif name == "ORI":
+            body.append(f"{t} = {s} | {imm}")
+        elif name == "XORI":
+            body.append(f"{t} = {s} ^ {imm}")
@@ -0,0 +1,120 @@
+# Образы памяти данных: двоичные файлы 32-битных слов и массивы NumPy .npy.
+#
+# Двоичный образ (.bin и любое другое расширение) — слова подряд без
+# заголовка в порядке байтов little или big. Файл .npy разбирается без
+# NumPy: поддерживаются одномерные (или в порядке C) массивы int32/uint32
+# в любом порядке байтов; uint32 загружается как знаковые слова.
+#
+# map_image отображает файл в память без копирования (mmap): страницы файла
+# становятся страницами PagedMemory, поэтому один и тот же входной набор
+# разделяется операционной системой между запусками и процессами.
+# По умолчанию отображение копируется при записи и файл не изменяется.
+
+import ast
+import mmap
+import struct
+import sys
+from array import array
+
+NPY_MAGIC = b"\x93NUMPY"
+
+# Слов на одну операцию чтения или записи при потоковом сохранении
+_CHUNK_WORDS = 1 << 16
+
+
+# Разбор заголовка .npy: порядок байтов, число слов и смещение данных
+def read_npy_header(file):
+    prefix = file.read(8)
+    if prefix[:6] != NPY_MAGIC:
+        raise ValueError("Неверный формат файла .npy")
+    major = prefix[6]
+    if major == 1:
+        (length,) = struct.unpack("<H", file.read(2))
+    elif major in (2, 3):
+        (length,) = struct.unpack("<I", file.read(4))
+    else:
+        raise ValueError(f"Неподдерживаемая версия .npy: {major}")
+    try:
+        header = ast.literal_eval(file.read(length).decode("latin1"))
+        descr, fortran_order, shape = header["descr"], header["fortran_order"], header["shape"]
+    except (ValueError, SyntaxError, KeyError, TypeError):
+        raise ValueError("Повреждённый заголовок .npy") from None
+    if descr not in ("<i4", ">i4", "<u4", ">u4"):
+        raise ValueError(f"Неподдерживаемый тип данных .npy: {descr} (нужен int32 или uint32)")
+    if fortran_order and sum(1 for n in shape if n != 1) > 1:
+        raise ValueError("Массивы .npy в порядке Fortran не поддерживаются")
+    count = 1
+    for n in shape:
+        count *= n
+    return ("little" if descr[0] == "<" else "big"), count, file.tell()
+
+
+def _npy_header(count, byteorder):
+    descr = "<i4" if byteorder == "little" else ">i4"
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({count},), }}"
+    # Данные выравниваются на 64 байта, заголовок завершается переводом строки
+    padding = -(len(NPY_MAGIC) + 4 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return NPY_MAGIC + bytes((1, 0)) + struct.pack("<H", len(header)) + header
+
+
+# Формат, порядок байтов, число слов и смещение данных файла образа
+def _layout(file, path, byteorder):
+    if path.endswith(".npy"):
+        return read_npy_header(file)
+    file.seek(0, 2)
+    size = file.tell()
+    if size % 4:
+        raise ValueError(f"Размер образа {path} не кратен машинному слову")
+    return byteorder, size // 4, 0
+
+
+# Чтение образа в массив слов (копия данных)
+def read_image(path, byteorder="little"):
+    with open(path, "rb") as file:
+        byteorder, count, offset = _layout(file, path, byteorder)
+        file.seek(offset)
+        words = array("i")
+        words.frombytes(file.read(4 * count))
+    if len(words) != count:
+        raise ValueError(f"Образ {path} обрезан")
+    if byteorder != sys.byteorder:
+        words.byteswap()
+    return words
+
+
+# Отображение образа в память без копирования: memoryview слов ('i').
+# writable=True записывает изменения в файл, иначе они остаются в памяти
+# процесса. Образ с порядком байтов, отличным от машинного, отобразить
+# нельзя — его нужно читать через read_image
+def map_image(path, byteorder="little", writable=False):
+    with open(path, "r+b" if writable else "rb") as file:
+        byteorder, count, offset = _layout(file, path, byteorder)
+        if byteorder != sys.byteorder:
+            raise ValueError(f"Порядок байтов образа {path} отличается от машинного")
+        if count == 0:
+            return memoryview(array("i"))
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_COPY)
+    if offset + 4 * count > len(mapping):
+        raise ValueError(f"Образ {path} обрезан")
+    return memoryview(mapping)[offset:offset + 4 * count].cast("i")
+
+
+# Сохранение count слов памяти memory начиная с адреса start; данные читаются
+# и записываются частями, без промежуточного массива во весь диапазон
+def write_image(path, memory, start=0, count=None, byteorder="little"):
+    if count is None:
+        count = memory.allocated_end() - start
+    count = max(0, count)
+    with open(path, "wb") as file:
+        if path.endswith(".npy"):
+            file.write(_npy_header(count, byteorder))
+        position = 0
+        while position < count:
+            n = min(_CHUNK_WORDS, count - position)
+            words = memory.read(start + position, n)
+            if byteorder != sys.byteorder:
+                words.byteswap()
+            file.write(words)
+            position += n
+    return count
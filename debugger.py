@@ -0,0 +1,169 @@
+# Точки останова, точки наблюдения за памятью и условия на регистры.
+#
+# Отладчик подключается к эмулятору при создании (emulator.debugger = None
+# отключает его и убирает ловушки) и встраивает проверки прямо в таблицу
+# предекодированных команд: обработчики только тех адресов, которых касаются
+# точки останова, наблюдение (все LW/SW) или условия (команды, пишущие
+# в нужный регистр), заменяются ловушками. Остальные команды выполняются без изменений, в том
+# числе в скомпилированных блоках, которые на ловушках обрываются.
+#
+# Точка останова и наблюдение срабатывают до выполнения команды: pc
+# остаётся на ней, а следующий запуск или шаг выполняет её без ловушки.
+# Условие проверяется после выполнения записывающей команды.
+
+import operator
+from collections import namedtuple
+
+from instructions import destination
+from processor import BREAK, BREAK_AFTER
+
+# Срабатывание: вид ("breakpoint", "watch", "condition"), адрес команды,
+# подробности и признак того, что команда уже выполнена
+Hit = namedtuple("Hit", ["kind", "pc", "detail", "executed"])
+
+# Наблюдаемый диапазон адресов данных [start, end) и вид доступа: "r", "w" или "rw"
+Watchpoint = namedtuple("Watchpoint", ["start", "end", "access"])
+
+# Условие на регистр: register op value
+Condition = namedtuple("Condition", ["register", "op", "value"])
+
+_OPERATORS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+              "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+
+class Debugger:
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.breakpoints = bytearray(len(emulator.instruction_memory))  # 1 — точка останова
+        self.watchpoints = []
+        self.conditions = []
+        self.traps = set()  # адреса команд с ловушками
+        self.stopped_at = None  # адрес, на котором ловушка остановила выполнение до команды
+        self.last_hit = None
+        emulator.debugger = self  # ловушки встраиваются при декодировании (apply)
+
+    def add_breakpoint(self, pc):
+        self.breakpoints[pc] = 1
+        self.apply()
+
+    def remove_breakpoint(self, pc):
+        self.breakpoints[pc] = 0
+        self.apply()
+
+    # Переключение точки останова; возвращает новое состояние
+    def toggle_breakpoint(self, pc):
+        self.breakpoints[pc] ^= 1
+        self.apply()
+        return bool(self.breakpoints[pc])
+
+    def add_watchpoint(self, start, end=None, access="rw"):
+        if access not in ("r", "w", "rw"):
+            raise ValueError(f"Неизвестный вид доступа: {access}")
+        watchpoint = Watchpoint(start, start + 1 if end is None else end, access)
+        self.watchpoints.append(watchpoint)
+        self.apply()
+        return watchpoint
+
+    def remove_watchpoint(self, watchpoint):
+        self.watchpoints.remove(watchpoint)
+        self.apply()
+
+    def add_condition(self, register, op, value):
+        if op not in _OPERATORS:
+            raise ValueError(f"Неизвестная операция сравнения: {op}")
+        condition = Condition(register, op, value)
+        self.conditions.append(condition)
+        self.apply()
+        return condition
+
+    def remove_condition(self, condition):
+        self.conditions.remove(condition)
+        self.apply()
+
+    def clear(self):
+        self.breakpoints = bytearray(len(self.breakpoints))
+        self.watchpoints.clear()
+        self.conditions.clear()
+        self.apply()
+
+    # Исходная команда по адресу pc без ловушки
+    def original(self, pc):
+        emulator = self.emulator
+        return emulator.predecode(emulator.instruction_memory[pc], pc)
+
+    # Пересборка ловушек в таблице предекодированных команд; вызывается при
+    # изменении настроек и эмулятором после изменения памяти команд
+    def apply(self):
+        emulator = self.emulator
+        decoded = emulator._decoded
+        size = len(decoded) - 1
+        if len(self.breakpoints) != size:
+            self.breakpoints = self.breakpoints[:size] + bytearray(max(0, size - len(self.breakpoints)))
+        for pc in self.traps:
+            if pc < size:
+                decoded[pc] = self.original(pc)
+
+        watched = {register for register, _, _ in self.conditions}
+        if self.watchpoints or watched:
+            candidates = range(size)
+        else:
+            candidates = []
+            pc = self.breakpoints.find(1)
+            while pc != -1:
+                candidates.append(pc)
+                pc = self.breakpoints.find(1, pc + 1)
+        traps = set()
+        for pc in candidates:
+            entry = decoded[pc]
+            watch = bool(self.watchpoints) and entry.name in ("LW", "SW")
+            condition = destination(entry) in watched
+            if self.breakpoints[pc] or watch or condition:
+                decoded[pc] = entry._replace(handler=self._trap(pc, entry, watch, condition))
+                traps.add(pc)
+        self.traps = traps
+        emulator._compiler.reset()
+        emulator._fused = None
+
+    def _trap(self, pc, entry, watch, condition):
+        if self.breakpoints[pc]:
+            def trap(emulator, rs, rt, rd, imm):
+                self.stopped_at = pc
+                self.last_hit = Hit("breakpoint", pc, None, False)
+                return BREAK
+            return trap
+
+        handler = entry.handler
+        access = "w" if entry.name == "SW" else "r"
+        register = destination(entry)
+
+        def trap(emulator, rs, rt, rd, imm):
+            if watch:
+                address = emulator.registers[rs] + imm
+                for watchpoint in self.watchpoints:
+                    if watchpoint.start <= address < watchpoint.end and access in watchpoint.access:
+                        self.stopped_at = pc
+                        self.last_hit = Hit("watch", pc, (address, access), False)
+                        return BREAK
+            target = handler(emulator, rs, rt, rd, imm)
+            if condition:
+                value = emulator.registers[register]
+                for watched in self.conditions:
+                    if watched.register == register and _OPERATORS[watched.op](value, watched.value):
+                        self.last_hit = Hit("condition", pc, watched, True)
+                        return BREAK_AFTER
+            return target
+        return trap
+
+    def describe(self, hit=None):
+        hit = hit or self.last_hit
+        if hit is None:
+            return ""
+        if hit.kind == "breakpoint":
+            return f"Точка останова: pc {hit.pc}"
+        if hit.kind == "watch":
+            address, access = hit.detail
+            kind = "запись" if access == "w" else "чтение"
+            return f"Наблюдение: {kind} Mem[{address * 4}] командой pc {hit.pc}"
+        register, op, value = hit.detail
+        return f"Условие R{register} {op} {value} выполнено после команды pc {hit.pc}"
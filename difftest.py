@@ -0,0 +1,224 @@
+# Сравнение механизмов выполнения на случайных программах.
+#
+# Каждая случайная программа выполняется пошагово (step), через
+# run_until_halt со слиянием пар команд и без него, через run_compiled и,
+# если установлен NumPy, на BatchEmulatorMIPS. Лимит шагов разбивается на
+# случайные части, поэтому проверяется и продолжение выполнения после
+# остановки по лимиту. Причина остановки, число шагов, pc, ошибка обращения
+# к памяти, регистры и память данных должны совпадать с пошаговым эталоном.
+#
+# Кроме того, переходы журнала (goto_step) по записанной истории должны
+# давать одно и то же состояние с подключёнными отладчиком и профилировщиком
+# и без них, а профилировщик не должен учитывать повторное выполнение.
+#
+# Пример:
+#   python difftest.py --programs 3000 --seed 1
+
+import argparse
+import logging
+import random
+import sys
+
+from debugger import Debugger
+from exceptions import MemoryAccessError
+from journal import ExecutionJournal
+from processor import HALT_END, HALT_FAULT, HALT_MAX_STEPS, EmulatorMIPS, RunResult
+from profiler import Profiler
+
+try:
+    import numpy as np
+
+    from batch import BatchEmulatorMIPS
+except ImportError:
+    BatchEmulatorMIPS = None
+
+# Размер памяти данных: маленький, чтобы программы обращались и за её пределы
+DATA_WORDS = 64
+
+_FUNCTS = (0x20, 0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27)  # ADD ... NOR
+_IMMEDIATE = (0x08, 0x09, 0x0C, 0x0D, 0x0E)  # ADDI ... XORI
+
+
+# Случайная программа из n слов; часть адресов занимают пары, которые
+# сливаются в run_until_halt (счётчик и переход, загрузка и сложение)
+def random_program(rng, n):
+    words = []
+    for _ in range(n):
+        kind = rng.random()
+        s, t, d = rng.randrange(8), rng.randrange(8), rng.randrange(8)
+        if kind < 0.35:
+            words.append((s << 21) | (t << 16) | (d << 11) | rng.choice(_FUNCTS))
+        elif kind < 0.65:
+            imm = rng.choice((rng.randrange(-5, 6), rng.randrange(-0x8000, 0x8000)))
+            words.append((rng.choice(_IMMEDIATE) << 26) | (s << 21) | (t << 16) | (imm & 0xFFFF))
+        elif kind < 0.8:
+            base = rng.choice((0, 0, 0, s))
+            words.append((rng.choice((0x23, 0x2B)) << 26) | (base << 21) | (t << 16)
+                         | (rng.randrange(-4, DATA_WORDS + 4) & 0xFFFF))
+        elif kind < 0.93:
+            words.append((rng.choice((0x04, 0x05)) << 26) | (s << 21) | (t << 16) | (rng.randrange(-n, n) & 0xFFFF))
+        elif kind < 0.96:
+            words.append(0)
+        elif kind < 0.98:
+            words.append((0x02 << 26) | rng.randrange(n))
+        else:
+            words.append(0xFFFFFFFF)
+    for _ in range(n // 4):
+        i = rng.randrange(n - 1) if n > 1 else 0
+        if i + 1 >= n:
+            break
+        r = rng.randrange(1, 8)
+        if rng.random() < 0.5:
+            imm = rng.choice((-1, 1, 0x7FFF, -0x8000))
+            words[i] = (rng.choice((0x08, 0x09)) << 26) | (r << 21) | (r << 16) | (imm & 0xFFFF)
+            words[i + 1] = (rng.choice((0x04, 0x05)) << 26) | (r << 21) | (rng.randrange(8) << 16) \
+                | (rng.randrange(-n, n) & 0xFFFF)
+        else:
+            words[i] = (0x23 << 26) | (rng.choice((0, 0, r)) << 21) | (r << 16) | (rng.randrange(-3, 16) & 0xFFFF)
+            words[i + 1] = (rng.randrange(8) << 21) | (r << 16) | (rng.randrange(8) << 11) | rng.choice((0x20, 0x21))
+    return words
+
+
+# Эталон: выполнение по одной команде через step(). Как и остальные
+# механизмы, за пределами памяти команд возвращает "end" даже при нулевом лимите
+def run_steps(emulator, max_steps):
+    if not 0 <= emulator.pc < len(emulator.instruction_memory):
+        return RunResult(HALT_END, 0, emulator.pc)
+    steps = 0
+    while steps < max_steps:
+        try:
+            reason = emulator.step()
+        except MemoryAccessError as error:
+            return RunResult(HALT_FAULT, steps, emulator.pc, error)
+        if reason is not None:
+            return RunResult(reason, steps, emulator.pc)
+        steps += 1
+    return RunResult(HALT_MAX_STEPS, steps, emulator.pc)
+
+
+ENGINES = {
+    "step": run_steps,
+    "run_until_halt": lambda emulator, max_steps: emulator.run_until_halt(max_steps),
+    "run_until_halt без слияния": lambda emulator, max_steps: emulator.run_until_halt(max_steps),
+    "run_compiled": lambda emulator, max_steps: emulator.run_compiled(max_steps),
+}
+
+
+def new_emulator(program, data, fusion=True):
+    emulator = EmulatorMIPS(data_words=DATA_WORDS)
+    emulator.fusion = fusion
+    emulator.load_program(program)
+    emulator.load_data(data)
+    return emulator
+
+
+def summary(result):
+    fault = result.fault
+    return result.reason, result.steps, result.pc, fault and (fault.pc, fault.address, fault.access)
+
+
+def state(emulator):
+    return emulator.pc, emulator.registers.tolist(), emulator.data_memory.read(0, DATA_WORDS).tolist()
+
+
+# Выполнение частями chunks; результаты частей и итоговое состояние
+def run_engine(name, program, data, chunks):
+    emulator = new_emulator(program, data, fusion=name != "run_until_halt без слияния")
+    run = ENGINES[name]
+    results = []
+    for chunk in chunks:
+        result = run(emulator, chunk)
+        results.append(summary(result))
+        if result.reason != HALT_MAX_STEPS:
+            break
+    return results, state(emulator)
+
+
+# Сравнение всех механизмов на одной программе; список расхождений
+def check_program(program, data, chunks):
+    expected = run_engine("step", program, data, chunks)
+    return [name for name in ENGINES if name != "step" and run_engine(name, program, data, chunks) != expected]
+
+
+# Переходы журнала к шагам targets после записи max_steps шагов истории;
+# с observers=True после записи подключаются отладчик (точки останова
+# breakpoints, наблюдение за всей памятью, условие на регистр) и профилировщик
+def run_journal(program, data, max_steps, targets, breakpoints, observers):
+    emulator = new_emulator(program, data)
+    journal = ExecutionJournal(emulator, checkpoint_interval=4)
+    run_steps(emulator, max_steps)
+    profiler = None
+    if observers:
+        debugger = Debugger(emulator)
+        for pc in breakpoints:
+            debugger.add_breakpoint(pc)
+        debugger.add_watchpoint(0, DATA_WORDS)
+        debugger.add_condition(1, "!=", 0)
+        profiler = Profiler(emulator)
+    end = journal.position
+    states = []
+    for target in targets:
+        reason = journal.goto_step(min(target, end))
+        states.append((journal.position, reason, state(emulator)))
+    return states, 0 if profiler is None else profiler.total
+
+
+def check_journal(program, data, max_steps, targets, breakpoints):
+    expected = run_journal(program, data, max_steps, targets, breakpoints, False)
+    return run_journal(program, data, max_steps, targets, breakpoints, True) == expected
+
+
+# Сравнение дорожек BatchEmulatorMIPS с эталоном на разных данных
+def check_batch(program, lanes_data, max_steps):
+    batch = BatchEmulatorMIPS(len(lanes_data), data_words=DATA_WORDS)
+    batch.load_program(program)
+    batch.load_data(np.array(lanes_data, dtype=np.int32))
+    result = batch.run_until_halt(max_steps=max_steps)
+    for lane, data in enumerate(lanes_data):
+        emulator = new_emulator(program, data)
+        expected = run_steps(emulator, max_steps)
+        fault_address = expected.fault.address if expected.fault is not None else -1
+        got = (result.reasons[lane], int(result.steps[lane]), int(result.pcs[lane]), int(result.fault_addresses[lane]),
+               batch.registers[lane].tolist(), batch.data_memory[lane].tolist())
+        if got != (expected.reason, expected.steps, expected.pc, fault_address,
+                   emulator.registers.tolist(), emulator.data_memory.read(0, DATA_WORDS).tolist()):
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение механизмов выполнения на случайных программах")
+    parser.add_argument("--programs", type=int, default=3000, help="число случайных программ")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора")
+    parser.add_argument("--lanes", type=int, default=8, help="дорожек BatchEmulatorMIPS на программу")
+    args = parser.parse_args(argv)
+    # Предупреждения о переполнении ADD/ADDI в случайных программах ожидаемы
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    failures = 0
+    for number in range(args.programs):
+        program = random_program(rng, rng.randrange(1, 40))
+        data = [rng.randrange(-100, 100) for _ in range(16)] + [0x7FFFFFFF]
+        chunks = [rng.choice((0, 1, 2, 3, 7, 50, 500, 3000)) for _ in range(rng.randrange(1, 4))]
+        mismatches = check_program(program, data, chunks)
+        targets = [rng.randrange(sum(chunks) + 1) for _ in range(4)] + [sum(chunks)]
+        breakpoints = rng.sample(range(len(program)), min(3, len(program)))
+        if not check_journal(program, data, sum(chunks), targets, breakpoints):
+            mismatches.append("ExecutionJournal.goto_step")
+        if BatchEmulatorMIPS is not None and args.lanes > 0:
+            lanes_data = [[rng.randrange(-100, 100) for _ in range(16)] for _ in range(args.lanes)]
+            if not check_batch(program, lanes_data, sum(chunks)):
+                mismatches.append("BatchEmulatorMIPS")
+        if mismatches:
+            failures += 1
+            print(f"Программа {number}: расхождение ({', '.join(mismatches)}), лимиты {chunks}")
+            print("  " + " ".join(f"{word:#010x}" for word in program))
+    if BatchEmulatorMIPS is None:
+        print("NumPy не установлен: BatchEmulatorMIPS не проверялся")
+    print(f"Программ: {args.programs}, с расхождениями: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
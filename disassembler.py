@@ -1,4 +1,101 @@
+import hashlib
+import os
 import re
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+# Версия формата объектного файла; входит в ключ кэша, поэтому при изменении
+# ассемблера старые записи кэша перестают использоваться
+OBJECT_VERSION = 3
+OBJECT_MAGIC = b"MIPSOBJ"
+
+STOP_WORD = 0xFFFFFFFF
+
+# Ошибка ассемблирования: номер строки (с 1), текст строки и описание
+AssemblyError = namedtuple("AssemblyError", ["line", "text", "message"])
+
+# Единый разборщик строки ассемблера: метка, мнемоника, операнды и комментарий
+_LINE = re.compile(r"\s*(?:(\w+)\s*:)?\s*(?:([A-Za-z]\w*)\s*([^#;]*))?(?:[#;].*)?")
+_MEMORY = re.compile(r"([-+]?\d+)\s*\(\s*(\w+)\s*\)")
+# Скобки адресации "off (Rn)" вместе с пробелами вокруг; операнды разделяются
+# запятыми или пробелами
+_BASE = re.compile(r"\s*\(\s*(\w+)\s*\)")
+_SEPARATOR = re.compile(r"\s*,\s*|\s+")
+_REGISTERS = {f"R{n}": n for n in range(32)}
+
+# Наибольшее число различных строк, коды которых запоминаются при
+# ассемблировании; ограничивает память при потоковом разборе больших файлов
+_ENCODED_LIMIT = 1 << 16
+
+
+# Результат ассемблирования: машинные слова, таблица меток и соответствие
+# адресов команд строкам исходного текста
+class ObjectCode:
+    def __init__(self, words, symbols, lines, errors=()):
+        self.words = words  # array('I')
+        self.symbols = symbols  # метка -> адрес
+        self.lines = lines  # array('I'): номер строки (с 1) для каждого адреса, 0 — нет строки
+        self.errors = list(errors)
+        self._pcs = None  # обратный индекс: номер строки -> адрес, строится при первом запросе
+
+    # Адрес команды, порождённой строкой line, или None (пустые строки,
+    # комментарии, строки только с меткой)
+    def pc_for_line(self, line):
+        if self._pcs is None:
+            pcs = {}
+            for pc, number in enumerate(self.lines):
+                if number:
+                    pcs.setdefault(number, pc)
+            self._pcs = pcs
+        return self._pcs.get(line)
+
+    def line_for_pc(self, pc):
+        if 0 <= pc < len(self.lines) and self.lines[pc]:
+            return self.lines[pc]
+        return None
+
+    # Двоичный формат: заголовок, слова, номера строк, таблица меток (всё little-endian)
+    def to_bytes(self):
+        words = array("I", self.words)
+        lines = array("I", self.lines)
+        if sys.byteorder != "little":
+            words.byteswap()
+            lines.byteswap()
+        parts = [OBJECT_MAGIC, struct.pack("<BII", OBJECT_VERSION, len(words), len(self.symbols)),
+                 words.tobytes(), lines.tobytes()]
+        for label, address in self.symbols.items():
+            name = label.encode()
+            parts.append(struct.pack("<HI", len(name), address))
+            parts.append(name)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        header = struct.Struct("<BII")
+        if data[:len(OBJECT_MAGIC)] != OBJECT_MAGIC:
+            raise ValueError("Неверный формат объектного файла")
+        offset = len(OBJECT_MAGIC)
+        version, count, symbol_count = header.unpack_from(data, offset)
+        if version != OBJECT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия объектного файла: {version}")
+        offset += header.size
+        words = array("I", data[offset:offset + 4 * count])
+        offset += 4 * count
+        lines = array("I", data[offset:offset + 4 * count])
+        offset += 4 * count
+        if sys.byteorder != "little":
+            words.byteswap()
+            lines.byteswap()
+        symbols = {}
+        for _ in range(symbol_count):
+            length, address = struct.unpack_from("<HI", data, offset)
+            offset += 6
+            symbols[data[offset:offset + length].decode()] = address
+            offset += length
+        return cls(words, symbols, lines)
+
 
 class DisassemblerMIPS:
     def __init__(self):
@@ -32,91 +129,170 @@ class DisassemblerMIPS:
             'XOR': 0x26,
             'NOR': 0x27,
         }
-        self.labels = {}  # Таблица меток
+        self.labels = {}  # Таблица меток последней программы для смещений переходов
+        self.symbols = {}  # Адреса меток (первая команда после метки)
+        self.errors = []  # Ошибки последнего ассемблирования (AssemblyError)
 
+    # Ассемблирование в список машинных слов с завершающей командой STOP
     def disassemble(self, asm_code):
-        program = []
-        lines = asm_code.splitlines()  # Разбиваем текст на строки
-
-        # Проход 1: Собираем метки
-        pc = 0  # Программный счетчик
-        for line in lines:
-            line = line.strip()
-            if line.endswith(':'):  # Если строка заканчивается на двоеточие — это метка
-                label = line[:-1]
-                self.labels[label] = pc  # Запоминаем адрес метки
-            else:
-                pc += 1  # Увеличиваем программный счётчик для каждой инструкции
-
-        # Проход 2: Преобразуем команды в машинный код
-        pc = 0
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if line.endswith(':'):
-                program.append(0)
-                pc += 1
+        return self.assemble(asm_code).words.tolist()
+
+    # Ассемблирование исходного текста программы (ObjectCode)
+    def assemble(self, asm_code):
+        return self.assemble_lines(asm_code.splitlines())
+
+    # Потоковое ассемблирование файла: исходный текст целиком в памяти не держится
+    def assemble_file(self, path):
+        with open(path) as file:
+            return self.assemble_lines(line.rstrip("\r\n") for line in file)
+
+    # Однопроходное ассемблирование последовательности строк: ссылки на метки
+    # запоминаются и дописываются в машинный код в конце, когда известны все
+    # метки. Метка не занимает ячейки и обозначает адрес следующей команды.
+    # Код строки без учёта ссылок зависит только от её текста, поэтому
+    # повторяющиеся строки разбираются один раз
+    def assemble_lines(self, source):
+        self.labels = {}
+        self.symbols = {}
+        self.errors = []
+        words = array("I")
+        lines = array("I")
+        fixups = []  # (адрес команды, метка, номер строки, текст строки)
+        encoded = {}  # текст строки -> (метка, машинный код или None, ссылка на метку)
+
+        for number, line in enumerate(source, 1):
+            entry = encoded.get(line)
+            if entry is None:
+                if len(encoded) >= _ENCODED_LIMIT:
+                    encoded.clear()
+                try:
+                    label, mnemonic, operands = self.tokenize(line)
+                    machine_code, reference = (None, None) if mnemonic is None else self.encode(mnemonic, operands)
+                except ValueError as e:
+                    self.errors.append(AssemblyError(number, line.strip(), str(e)))
+                    continue
+                entry = encoded[line] = (label, machine_code, reference)
+            label, machine_code, reference = entry
+            if label is not None:
+                if label in self.labels:
+                    self.errors.append(AssemblyError(number, line.strip(), f"Метка '{label}' уже определена"))
+                    continue
+                self.labels[label] = self.symbols[label] = len(words)
+            if machine_code is None:
                 continue
+            if reference is not None:
+                fixups.append((len(words), reference, number, line))
+            words.append(machine_code)
+            lines.append(number)
+
+        # Дописывание ссылок на метки
+        for pc, label, number, text in fixups:
             try:
-                machine_code = self.assemble_instruction(line, pc)  # Преобразуем строку в машинный код
-                program.append(machine_code)
-                pc += 1
+                words[pc] |= self.label_field(words[pc] >> 26, label, pc)
             except ValueError as e:
-                print(f"Ошибка обработки строки '{line}': {e}")
-        program.append(4294967295)
-        return program
-
-    def assemble_instruction(self, line, pc):
-        parts = line.split()
-        instr = parts[0]
-
-        if instr in self.funct_map:  # R-формат
-            rd = self.parse_register(parts[1].strip(','))
-            rs = self.parse_register(parts[2].strip(','))
-            rt = self.parse_register(parts[3])
-            opcode = self.opcode_map[instr] << 26
-            funct = self.funct_map[instr]
-            machine_code = (opcode | (rs << 21) | (rt << 16) | (rd << 11) | funct)
-            return machine_code
-
-        elif instr in self.opcode_map:
-            if instr in ['LW', 'SW']:
-                rt = self.parse_register(parts[1].strip(','))
-                offset, base_register = self.parse_memory_address(parts[2])
-                if offset < 0:
-                    offset = (1 << 16) + offset
-                opcode = self.opcode_map[instr] << 26
-                machine_code = (opcode | (base_register << 21) | (rt << 16) | (offset & 0xFFFF))
-                return machine_code
-            else:  # I-формат
-                rt = self.parse_register(parts[1].strip(','))
-                rs = self.parse_register(parts[2].strip(','))
-
-                # Поддержка меток для команд с переходами
-                if instr in ['BEQ', 'BNE']:
-                    imm = self.resolve_label(parts[3], pc)
-                else:
-                    imm = int(parts[3])
-
-                imm = self.check_immediate(imm, bits=16)  # Проверка размера значения
-                opcode = self.opcode_map[instr] << 26
-                machine_code = (opcode | (rs << 21) | (rt << 16) | (imm & 0xFFFF))
-                return machine_code
-        else:
+                self.errors.append(AssemblyError(number, text.strip(), str(e)))
+        self.errors.sort(key=lambda error: error.line)
+
+        words.append(STOP_WORD)
+        lines.append(0)
+        return ObjectCode(words, dict(self.symbols), lines, self.errors)
+
+    # Разбор строки на метку, мнемонику (в верхнем регистре) и список операндов
+    def tokenize(self, line):
+        match = _LINE.fullmatch(line)
+        if match is None:
+            raise ValueError("Синтаксическая ошибка")
+        label, mnemonic, rest = match.groups()
+        if mnemonic is None:
+            return label, None, []
+        # Операнды разделяются запятыми или пробелами; "0 (R2)" равно "0(R2)"
+        rest = _BASE.sub(r"(\1)", rest).strip() if rest else ""
+        operands = _SEPARATOR.split(rest) if rest else []
+        if "" in operands:
+            raise ValueError("Пропущен операнд")
+        return label, mnemonic.upper(), operands
+
+    # Кодирование команды; возвращает машинный код и метку, адрес которой
+    # нужно дописать позже (или None)
+    def encode(self, instr, operands):
+        funct = self.funct_map.get(instr)
+        if funct is not None:  # R-формат
+            self.expect_count(instr, operands, 3)
+            rd, rs, rt = map(self.register, operands)
+            return (rs << 21) | (rt << 16) | (rd << 11) | funct, None
+        opcode = self.opcode_map.get(instr)
+        if opcode is None:
             raise ValueError(f"Неизвестная инструкция: {instr}")
+        opcode <<= 26
+
+        if instr == 'J':
+            self.expect_count(instr, operands, 1)
+            target = operands[0]
+            if self.is_label(target):
+                return opcode, target
+            target = self.number(target)
+            if not 0 <= target < (1 << 26):
+                raise ValueError(f"Некорректный адрес перехода: {target}")
+            return opcode | target, None
+
+        if instr == 'LW' or instr == 'SW':
+            self.expect_count(instr, operands, 2)
+            rt = self.register(operands[0])
+            offset, base_register = self.parse_memory_address(operands[1])
+            offset = self.check_immediate(offset, bits=16)
+            return opcode | (base_register << 21) | (rt << 16) | (offset & 0xFFFF), None
+
+        # I-формат
+        self.expect_count(instr, operands, 3)
+        rt, rs, value = operands
+        machine_code = opcode | (self.register(rs) << 21) | (self.register(rt) << 16)
+        if (instr == 'BEQ' or instr == 'BNE') and self.is_label(value):
+            # Поддержка меток для команд с переходами
+            return machine_code, value
+        imm = self.check_immediate(self.number(value), bits=16)  # Проверка размера значения
+        return machine_code | (imm & 0xFFFF), None
+
+    # Поле машинного кода, ссылающееся на метку
+    def label_field(self, opcode, label, pc):
+        if opcode == self.opcode_map['J']:
+            if label not in self.symbols:
+                raise ValueError(f"Метка '{label}' не найдена")
+            return self.symbols[label]
+        return self.check_immediate(self.resolve_label(label, pc), bits=16) & 0xFFFF
+
+    def expect_count(self, instr, operands, count):
+        if len(operands) != count:
+            raise ValueError(f"Команда {instr} принимает {count} операнд(а), получено {len(operands)}")
+
+    def register(self, reg_str):
+        reg_num = _REGISTERS.get(reg_str)
+        return self.parse_register(reg_str) if reg_num is None else reg_num
+
+    def number(self, text):
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            return int(text, 16) if text.lstrip("+-")[:2] in ("0x", "0X") else int(text, 0)
+        except ValueError:
+            raise ValueError(f"Некорректное число: {text}") from None
 
-    # Метод для преобразования метки в адрес
+    def is_label(self, text):
+        return (text[0].isalpha() or text[0] == "_") and text not in _REGISTERS and not self.is_register(text)
+
+    # Смещение перехода на метку относительно команды, следующей за переходом
     def resolve_label(self, label, pc):
         if label in self.labels:
-            target_pc = self.labels[label]
-            offset = target_pc - pc + 1
-            return offset
+            return self.labels[label] - (pc + 1)
         else:
             raise ValueError(f"Метка '{label}' не найдена")
 
+    def is_register(self, reg_str):
+        return reg_str[:1] == 'R' and reg_str[1:].isdigit()
+
     def parse_register(self, reg_str):
-        if reg_str[0] != 'R' or not reg_str[1:].isdigit():
+        if not self.is_register(reg_str):
             raise ValueError(f"Некорректный регистр: {reg_str}")
         reg_num = int(reg_str[1:])
         if not (0 <= reg_num < 32):
@@ -124,10 +300,10 @@ class DisassemblerMIPS:
         return reg_num
 
     def parse_memory_address(self, address_str):
-        match = re.match(r'(-?\d+)\((R\d+)\)', address_str)
+        match = _MEMORY.fullmatch(address_str)
         if match:
             offset = int(match.group(1))
-            base_register = self.parse_register(match.group(2))
+            base_register = self.register(match.group(2))
             return offset, base_register
         else:
             raise ValueError(f"Некорректная адресация: {address_str}")
@@ -138,3 +314,48 @@ class DisassemblerMIPS:
         if not (min_val <= imm <= max_val):
             raise ValueError(f"Непосредственное значение {imm} выходит за пределы {bits}-битного диапазона")
         return imm
+
+    # Ассемблирование с кэшем объектного кода на диске: ключ — хэш исходного
+    # текста, поэтому неизменённая программа повторно не ассемблируется.
+    # Программы с ошибками не кэшируются
+    def assemble_cached(self, asm_code, cache_dir=None):
+        digest = hashlib.sha256(f"{OBJECT_VERSION}\n{asm_code}".encode()).hexdigest()
+        return self._cached(digest, lambda: self.assemble(asm_code), cache_dir)
+
+    # То же для файла: хэш считается по частям, при промахе файл ассемблируется потоково
+    def assemble_file_cached(self, path, cache_dir=None):
+        digest = hashlib.sha256(f"{OBJECT_VERSION}\n".encode())
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        return self._cached(digest.hexdigest(), lambda: self.assemble_file(path), cache_dir)
+
+    def _cached(self, digest, assemble, cache_dir):
+        cache_dir = cache_dir or default_cache_dir()
+        path = os.path.join(cache_dir, digest + ".mobj")
+        try:
+            with open(path, "rb") as file:
+                code = ObjectCode.from_bytes(file.read())
+        except (OSError, ValueError, struct.error):
+            code = None
+        if code is not None:
+            self.symbols = dict(code.symbols)
+            self.errors = []
+            return code
+
+        code = assemble()
+        if not code.errors:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                temporary = f"{path}.{os.getpid()}.tmp"
+                with open(temporary, "wb") as file:
+                    file.write(code.to_bytes())
+                os.replace(temporary, path)
+            except OSError:
+                pass  # кэш необязателен
+        return code
+
+
+# Каталог кэша: $MIPS_CACHE_DIR или ~/.cache/mips32-emulator
+def default_cache_dir():
+    return os.environ.get("MIPS_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "mips32-emulator")
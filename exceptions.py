@@ -2,3 +2,15 @@ class EmptyException(Exception):
     def __str__(self):
         return f"Команда завершена"
 
+
+class MemoryAccessError(Exception):
+    def __init__(self, address, access, pc=None):
+        super().__init__(address, access, pc)
+        self.address = address
+        self.access = access  # "read" или "write"
+        self.pc = pc  # адрес команды, вызвавшей ошибку
+
+    def __str__(self):
+        kind = "чтения" if self.access == "read" else "записи"
+        where = f" (команда {self.pc})" if self.pc is not None else ""
+        return f"Ошибка {kind} памяти данных по адресу {self.address}{where}"
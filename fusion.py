@@ -0,0 +1,122 @@
+# Слияние частых пар команд в суперкоманды для цикла run_until_halt.
+#
+# После каждого изменения таблицы предекодированных команд для каждого
+# адреса, с которого начинается известная пара (счётчик цикла и переход,
+# загрузка и накопление суммы), строится одна команда, выполняющая обе.
+# Слитые команды хранятся в отдельной таблице, второй адрес пары в ней
+# остаётся обычной командой, поэтому переход в середину пары выполняет
+# только её вторую команду. Пары могут перекрываться.
+#
+# Сливаются только исходные обработчики: ловушки отладчика и обработчики
+# профилировщика не сливаются. Первая команда пары — единственная, которая
+# может обратиться к памяти, поэтому ошибка обращения происходит до
+# изменения состояния и слитая команда не выполняется целиком.
+
+from collections import Counter, namedtuple
+
+# Команда таблицы слитых команд: поля первой команды пары и число
+# выполняемых команд (1 — обычная команда, 2 — слитая пара)
+FusedInstruction = namedtuple("FusedInstruction", ["handler", "rs", "rt", "rd", "imm", "length"])
+
+
+def _addi_beq(second, warn):
+    x, y, target = second.rs, second.rt, second.imm
+
+    def fused(emulator, rs, rt, rd, imm):
+        regs = emulator.registers
+        result = regs[rs] + imm
+        if -0x80000000 <= result <= 0x7FFFFFFF:
+            regs[rt] = result
+        else:
+            warn("Overflow detected in ADDI operation")
+        if regs[x] == regs[y]:
+            return target
+    return fused
+
+
+def _addi_bne(second, warn):
+    x, y, target = second.rs, second.rt, second.imm
+
+    def fused(emulator, rs, rt, rd, imm):
+        regs = emulator.registers
+        result = regs[rs] + imm
+        if -0x80000000 <= result <= 0x7FFFFFFF:
+            regs[rt] = result
+        else:
+            warn("Overflow detected in ADDI operation")
+        if regs[x] != regs[y]:
+            return target
+    return fused
+
+
+def _addiu_beq(second, warn):
+    x, y, target = second.rs, second.rt, second.imm
+
+    def fused(emulator, rs, rt, rd, imm):
+        regs = emulator.registers
+        regs[rt] = ((regs[rs] + imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        if regs[x] == regs[y]:
+            return target
+    return fused
+
+
+def _addiu_bne(second, warn):
+    x, y, target = second.rs, second.rt, second.imm
+
+    def fused(emulator, rs, rt, rd, imm):
+        regs = emulator.registers
+        regs[rt] = ((regs[rs] + imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        if regs[x] != regs[y]:
+            return target
+    return fused
+
+
+def _lw_add(second, warn):
+    x, y, z = second.rs, second.rt, second.rd
+
+    def fused(emulator, rs, rt, rd, imm):
+        regs = emulator.registers
+        regs[rt] = emulator.data_memory.load(regs[rs] + imm)
+        result = regs[x] + regs[y]
+        if -0x80000000 <= result <= 0x7FFFFFFF:
+            regs[z] = result
+        else:
+            warn("Overflow detected in ADD operation")
+    return fused
+
+
+def _lw_addu(second, warn):
+    x, y, z = second.rs, second.rt, second.rd
+
+    def fused(emulator, rs, rt, rd, imm):
+        regs = emulator.registers
+        regs[rt] = emulator.data_memory.load(regs[rs] + imm)
+        regs[z] = ((regs[x] + regs[y] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+    return fused
+
+
+# Пары команд (по мнемоникам) и построители слитых обработчиков
+PATTERNS = {
+    ("ADDI", "BEQ"): _addi_beq,
+    ("ADDI", "BNE"): _addi_bne,
+    ("ADDIU", "BEQ"): _addiu_beq,
+    ("ADDIU", "BNE"): _addiu_bne,
+    ("LW", "ADD"): _lw_add,
+    ("LW", "ADDU"): _lw_addu,
+}
+
+
+# Таблица слитых команд для таблицы decoded (последний элемент — ограничитель
+# конца памяти). names сопоставляет исходным обработчикам мнемоники.
+# Возвращает таблицу и число слитых пар по видам ("ADDI+BNE": n)
+def fuse(decoded, names, warn):
+    table = [FusedInstruction(entry.handler, entry.rs, entry.rt, entry.rd, entry.imm, 1) for entry in decoded]
+    stats = Counter()
+    for pc in range(len(decoded) - 2):
+        first, second = decoded[pc], decoded[pc + 1]
+        pair = (names.get(first.handler), names.get(second.handler))
+        build = PATTERNS.get(pair)
+        if build is not None:
+            table[pc] = FusedInstruction(build(second, warn), first.rs, first.rt, first.rd, first.imm, 2)
+            stats["+".join(pair)] += 1
+    return table, stats
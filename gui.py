@@ -1,8 +1,84 @@
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from processor import EmulatorMIPS
+from processor import (EmulatorMIPS, HALT_STOP, HALT_END, HALT_FAULT, HALT_MAX_STEPS, HALT_MAX_TIME,
+                       HALT_BREAKPOINT)
+from debugger import Debugger
 from disassembler import DisassemblerMIPS
-from exceptions import EmptyException
+from journal import ExecutionJournal
+from profiler import Profiler
+
+# Длительность одного отрезка непрерывного выполнения, секунды: между
+# отрезками Tk обрабатывает события, поэтому окно не зависает
+SLICE_TIME = 0.02
+# Минимальный интервал обновления регистров и памяти при выполнении, секунды
+REFRESH_PERIOD = 0.1
+
+
+# Прокручиваемая таблица: метки создаются только для видимых строк, при
+# прокрутке меняется их содержимое. Обновляются только изменившиеся строки,
+# изменившиеся значения выделяются цветом
+class VirtualTable(tk.Frame):
+    def __init__(self, master, row_count, visible_rows, fetch, format_row, width=24):
+        super().__init__(master)
+        self.row_count = row_count
+        self.visible_rows = min(visible_rows, row_count)
+        self.fetch = fetch  # fetch(first, count) -> значения строк first..first+count-1
+        self.format_row = format_row  # format_row(index, value) -> текст строки
+        self.first = 0
+        self._shown = [None] * self.visible_rows  # (индекс, значение) в каждой метке
+        self._changed = set()  # строки, выделенные как изменившиеся
+
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.labels = []
+        for _ in range(self.visible_rows):
+            label = tk.Label(self, anchor="w", width=width, font="TkFixedFont")
+            label.pack(anchor="w")
+            self.labels.append(label)
+        for widget in [self] + self.labels:
+            widget.bind("<MouseWheel>", self._on_wheel)
+            widget.bind("<Button-4>", lambda event: self.scroll_to(self.first - 1))
+            widget.bind("<Button-5>", lambda event: self.scroll_to(self.first + 1))
+        self.refresh()
+
+    # Обработчик полосы прокрутки
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.row_count))
+        elif args[0] == "scroll":
+            step = self.visible_rows if args[2] == "pages" else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        self.scroll_to(self.first - (1 if event.delta > 0 else -1))
+
+    # Прокрутка так, чтобы строка first стала первой видимой
+    def scroll_to(self, first):
+        first = max(0, min(first, self.row_count - self.visible_rows))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def refresh(self):
+        values = self.fetch(self.first, self.visible_rows)
+        for row, value in enumerate(values):
+            index = self.first + row
+            shown = self._shown[row]
+            if shown == (index, value):
+                if row in self._changed:
+                    self.labels[row].config(fg="black")
+                    self._changed.discard(row)
+                continue
+            # Значение изменилось по тому же адресу, а не из-за прокрутки
+            changed = shown is not None and shown[0] == index
+            self.labels[row].config(text=self.format_row(index, value), fg="red" if changed else "black")
+            if changed:
+                self._changed.add(row)
+            else:
+                self._changed.discard(row)
+            self._shown[row] = (index, value)
+        self.scrollbar.set(self.first / self.row_count, (self.first + self.visible_rows) / self.row_count)
 
 
 class AssemblerGUI:
@@ -19,97 +95,272 @@ class AssemblerGUI:
         self.run_button.pack(side=tk.LEFT)
         self.next_button = tk.Button(button_frame, text="Следующий шаг", command=self.next_step)
         self.next_button.pack(side=tk.LEFT)
+        self.continue_button = tk.Button(button_frame, text="Выполнить", command=self.toggle_execution)
+        self.continue_button.pack(side=tk.LEFT)
+        self.stop_button = tk.Button(button_frame, text="Стоп", command=self.stop)
+        self.stop_button.pack(side=tk.LEFT)
         self.load_button = tk.Button(button_frame, text="Загрузить из файла", command=self.load_from_file)
         self.load_button.pack(side=tk.LEFT)
         self.save_button = tk.Button(button_frame, text="Сохранить в файл", command=self.save_to_file)
         self.save_button.pack(side=tk.LEFT)
-        # self.prev_button = tk.Button(button_frame, text="<", command=self.previous_step)
-        # self.prev_button.pack(side=tk.LEFT)
+        self.prev_button = tk.Button(button_frame, text="<", command=self.previous_step)
+        self.prev_button.pack(side=tk.LEFT)
+        self.load_data_button = tk.Button(button_frame, text="Загрузить данные", command=self.load_data_image)
+        self.load_data_button.pack(side=tk.LEFT)
+        self.save_data_button = tk.Button(button_frame, text="Сохранить данные", command=self.save_data_image)
+        self.save_data_button.pack(side=tk.LEFT)
+        # Профилировщик подключается только по запросу
+        self.profiling = tk.BooleanVar(value=False)
+        self.profile_check = tk.Checkbutton(button_frame, text="Профилирование", variable=self.profiling,
+                                            command=self.toggle_profiling)
+        self.profile_check.pack(side=tk.LEFT)
+        self.profile_button = tk.Button(button_frame, text="Профиль", command=self.show_profile)
+        self.profile_button.pack(side=tk.LEFT)
 
 
         # Используем Frame для текстовой области и дополнительных элементов
         content_frame = tk.Frame(self.root)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
+        # Поле номеров строк: щелчок ставит или снимает точку останова
+        self.gutter = tk.Text(content_frame, height=20, width=5, cursor="hand2", background="#eeeeee",
+                              borderwidth=0, state=tk.DISABLED)
+        self.gutter.grid(row=0, column=0, pady=10, sticky='ns')
+        self.gutter.tag_configure("breakpoint", foreground="red")
+        self.gutter.bind("<Button-1>", self._on_gutter_click)
+
         # Поле для ввода ассемблерного кода
         self.text_area = tk.Text(content_frame, height=20, width=60)
-        self.text_area.grid(row=0, column=0, padx=10, pady=10)
+        self.text_area.grid(row=0, column=1, padx=(0, 10), pady=10)
+        self.text_area.config(yscrollcommand=lambda first, last: self.gutter.yview_moveto(first))
+        self.text_area.bind("<KeyRelease>", lambda event: self.update_gutter())
 
         # Область для отображения регистров
         self.reg_frame = tk.LabelFrame(content_frame, text="Регистры")
-        self.reg_frame.grid(row=0, column=1, padx=10, pady=10, sticky='n')
+        self.reg_frame.grid(row=0, column=2, padx=10, pady=10, sticky='n')
 
         # Область для отображения памяти
         self.mem_frame = tk.LabelFrame(content_frame, text="Память")
-        self.mem_frame.grid(row=0, column=2, padx=10, pady=10, sticky='n')
+        self.mem_frame.grid(row=0, column=3, padx=10, pady=10, sticky='n')
 
         self.processor = EmulatorMIPS()
         self.disassembler = DisassemblerMIPS()
-        self.processor.data_memory[0:3] = [1, 2, 3, 4]
+        self.processor.load_data([1, 2, 3, 4])
+        # Журнал выполнения для шага назад
+        self.journal = ExecutionJournal(self.processor)
+        # Точки останова задаются строками исходного текста и переносятся
+        # на адреса команд после каждого ассемблирования
+        self.debugger = Debugger(self.processor)
+        self.breakpoint_lines = set()
+        self.object_code = None  # результат последнего ассемблирования
 
-        self.reg_labels = []
-        for i in range(10):  # Отображаем первые 10 регистров
-            label = tk.Label(self.reg_frame, text=f"R{i}: 0")
-            label.pack(anchor='w')
-            self.reg_labels.append(label)
+        # Все 32 регистра и вся память данных в прокручиваемых таблицах
+        self.reg_table = VirtualTable(self.reg_frame, 32, 16, self._fetch_registers,
+                                      lambda i, value: f"R{i}: {value}")
+        self.reg_table.pack()
 
-        self.mem_labels = []
-        for i in range(10):  # Отображаем первые 10 ячеек памяти
-            label = tk.Label(self.mem_frame, text=f"Mem[{i * 4}]: 0")
-            label.pack(anchor='w')
-            self.mem_labels.append(label)
+        # Переход к адресу памяти (в байтах, как в подписях ячеек)
+        address_frame = tk.Frame(self.mem_frame)
+        address_frame.pack(fill=tk.X)
+        self.address_entry = tk.Entry(address_frame, width=12)
+        self.address_entry.pack(side=tk.LEFT)
+        self.address_entry.bind("<Return>", lambda event: self.go_to_address())
+        tk.Button(address_frame, text="Перейти", command=self.go_to_address).pack(side=tk.LEFT)
+        self.mem_table = VirtualTable(self.mem_frame, len(self.processor.data_memory), 16,
+                                      self._fetch_memory, lambda i, value: f"Mem[{i * 4}]: {value}")
+        self.mem_table.pack()
+
+        self.status_label = tk.Label(self.root, anchor="w")
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=20)
 
-        self.update_register_display()
-        self.update_memory_display()
         self.run_flag = 0
+        self.running = False  # идёт непрерывное выполнение
+        self._job = None  # запланированный отрезок выполнения
+        self._last_refresh = 0.0
+        self.update_gutter()
+        self.refresh_views()
+
+    def _fetch_registers(self, first, count):
+        return self.processor.registers[first:first + count].tolist()
+
+    def _fetch_memory(self, first, count):
+        return self.processor.data_memory.read(first, count).tolist()
 
     # Функция для обновления отображения регистров
     def update_register_display(self):
-        for i in range(10):
-            value = self.processor.registers[i]
-            self.reg_labels[i].config(text=f"R{i}: {value}")
+        self.reg_table.refresh()
 
     # Функция для обновления отображения памяти
     def update_memory_display(self):
-        for i in range(10):
-            value = self.processor.data_memory[i]
-            self.mem_labels[i].config(text=f"Mem[{i * 4}]: {value}")
+        self.mem_table.refresh()
+
+    # Обновление регистров, памяти, текущей строки и строки состояния
+    def refresh_views(self):
+        self.update_register_display()
+        self.update_memory_display()
+        if self.run_flag == 1:
+            self.highlight_pc(self.processor.pc)
+        state = "выполняется" if self.running else ("пауза" if self.run_flag == 1 else "остановлена")
+        text = f"Программа {state}, шаг {self.journal.position}, pc {self.processor.pc}"
+        if self.debugger.last_hit is not None and not self.running:
+            text += f". {self.debugger.describe()}"
+        self.status_label.config(text=text)
+        self._last_refresh = time.perf_counter()
+
+    def go_to_address(self):
+        try:
+            address = int(self.address_entry.get(), 0)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Некорректный адрес")
+            return
+        self.mem_table.scroll_to(address // 4)
 
     # Запуск программы на эмуляторе
     def run(self):
-        code = self.text_area.get("1.0", tk.END).strip()
-        if code:
+        self.pause()
+        # Текст ассемблируется без обрезки, чтобы номера строк совпадали с полем ввода
+        code = self.text_area.get("1.0", "end-1c")
+        if code.strip():
             try:
-                program = self.disassembler.disassemble(code)
+                object_code = self.disassembler.assemble(code)
+                if object_code.errors:
+                    messagebox.showerror("Ошибки ассемблирования", "\n".join(
+                        f"Строка {error.line}: {error.message}" for error in object_code.errors))
+                    return
 
-                self.processor.load_program(program)
+                self.object_code = object_code
+                self.processor.load_program(object_code.words)
+                self.debugger.last_hit = None
+                self.apply_breakpoints()
 
-                self.processor.run()
+                self.processor.step()
                 self.run_flag = 1
-                self.highlight_line(self.processor.pc)
                 print("Программа успешно запущена")
 
-                self.update_register_display()
-                self.update_memory_display()
+                self.refresh_views()
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
         else:
             messagebox.showwarning("Внимание", "Поле ввода команд пустое!")
 
     def next_step(self):
+        self.pause()
         if self.run_flag == 1:
             try:
-                self.processor.run()
-                self.update_register_display()
-                self.update_memory_display()
-                self.highlight_line(self.processor.pc)
-            except EmptyException as e:
-                messagebox.showinfo("Внимание", str(e))
+                self.debugger.last_hit = None
+                reason = self.processor.step()
+                self.refresh_views()
+                if reason == HALT_STOP:
+                    messagebox.showinfo("Внимание", "Команда завершена")
+                elif reason == HALT_END:
+                    messagebox.showinfo("Внимание", "Достигнут конец памяти команд")
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
         else:
             messagebox.showerror("Ошибка", "Программа не запущена")
 
+    # Возврат на один шаг назад по журналу выполнения
+    def previous_step(self):
+        self.pause()
+        if self.run_flag == 1:
+            if self.journal.step_back():
+                self.refresh_views()
+            else:
+                messagebox.showinfo("Внимание", "Это первый шаг программы")
+        else:
+            messagebox.showerror("Ошибка", "Программа не запущена")
+
+    # Непрерывное выполнение с текущего шага или пауза
+    def toggle_execution(self):
+        if self.running:
+            self.pause()
+        elif self.run_flag == 1:
+            self.running = True
+            self.debugger.last_hit = None
+            self.continue_button.config(text="Пауза")
+            self._job = self.root.after(0, self._run_slice)
+        else:
+            messagebox.showerror("Ошибка", "Программа не запущена")
+
+    def pause(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        if self.running:
+            self.running = False
+            self.continue_button.config(text="Выполнить")
+            self.refresh_views()
+
+    # Завершение выполнения программы
+    def stop(self):
+        self.pause()
+        self.run_flag = 0
+        self.text_area.tag_remove("highlight", "1.0", tk.END)
+        self.refresh_views()
+
+    # Один отрезок непрерывного выполнения; следующий планируется через after(),
+    # чтобы между отрезками обрабатывались события окна
+    def _run_slice(self):
+        self._job = None
+        try:
+            result = self.processor.run_until_halt(max_time=SLICE_TIME)
+        except Exception as e:
+            self.pause()
+            messagebox.showerror("Ошибка", str(e))
+            return
+        if result.reason in (HALT_MAX_TIME, HALT_MAX_STEPS):
+            if time.perf_counter() - self._last_refresh >= REFRESH_PERIOD:
+                self.refresh_views()
+            self._job = self.root.after(1, self._run_slice)
+            return
+        self.pause()
+        if result.reason == HALT_STOP:
+            messagebox.showinfo("Внимание", "Команда завершена")
+        elif result.reason == HALT_END:
+            messagebox.showinfo("Внимание", "Достигнут конец памяти команд")
+        elif result.reason == HALT_FAULT:
+            messagebox.showerror("Ошибка", str(result.fault))
+        elif result.reason == HALT_BREAKPOINT:
+            self.refresh_views()
+
+    def toggle_profiling(self):
+        if self.profiling.get():
+            Profiler(self.processor)
+        else:
+            self.processor.profiler = None
+
+    # Окно с исходным текстом, размеченным числом выполнений строк, и отчётом профилировщика
+    def show_profile(self):
+        profiler = self.processor.profiler
+        if profiler is None or self.object_code is None:
+            messagebox.showerror("Ошибка", "Включите профилирование и запустите программу")
+            return
+        self.pause()
+        window = tk.Toplevel(self.root)
+        window.title("Профиль")
+        code = self.text_area.get("1.0", tk.END)
+        listing = tk.Text(window, height=30, width=100, font="TkFixedFont")
+        listing.pack(fill=tk.BOTH, expand=True)
+        listing.insert(tk.END, profiler.annotate(code, self.object_code) + "\n\n" + profiler.report(self.object_code))
+        listing.config(state=tk.DISABLED)
+        tk.Button(window, text="Экспорт callgrind", command=self.export_callgrind).pack(side=tk.LEFT)
+        tk.Button(window, text="Экспорт flamegraph", command=self.export_collapsed).pack(side=tk.LEFT)
+
+    def export_callgrind(self):
+        self._export_profile(".out", lambda file: self.processor.profiler.write_callgrind(file, self.object_code))
+
+    def export_collapsed(self):
+        self._export_profile(".folded", lambda file: self.processor.profiler.write_collapsed(file, self.object_code))
+
+    def _export_profile(self, extension, write):
+        file_path = filedialog.asksaveasfilename(defaultextension=extension)
+        if file_path:
+            try:
+                with open(file_path, "w") as file:
+                    write(file)
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Ошибка при сохранении файла: {str(e)}")
+
     # Загрузка программы из файла
     def load_from_file(self):
         file_path = filedialog.askopenfilename(defaultextension=".asm", filetypes=[("Assembly files", "*.asm"), ("Text files", "*.txt")])
@@ -119,6 +370,8 @@ class AssemblerGUI:
                     code = file.read()
                     self.text_area.delete("1.0", tk.END)
                     self.text_area.insert(tk.END, code)
+                self.breakpoint_lines.clear()
+                self.update_gutter()
                 print(f"Программа загружена из {file_path}")
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка при загрузке файла: {str(e)}")
@@ -135,11 +388,74 @@ class AssemblerGUI:
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка при сохранении файла: {str(e)}")
 
+    _IMAGE_TYPES = [("Образы памяти", "*.bin *.npy"), ("NumPy", "*.npy"), ("Двоичные файлы", "*.bin")]
+
+    # Загрузка образа памяти данных (.bin little-endian или .npy) с адреса 0
+    def load_data_image(self):
+        file_path = filedialog.askopenfilename(filetypes=self._IMAGE_TYPES)
+        if file_path:
+            try:
+                self.processor.load_data_image(file_path)
+                self.refresh_views()
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Ошибка при загрузке образа памяти: {str(e)}")
+
+    # Сохранение памяти данных до конца последней выделенной страницы
+    def save_data_image(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".npy", filetypes=self._IMAGE_TYPES)
+        if file_path:
+            try:
+                count = self.processor.save_data_image(file_path)
+                print(f"Сохранено слов памяти данных: {count} в {file_path}")
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Ошибка при сохранении образа памяти: {str(e)}")
+
+    # Номера строк исходного текста с отметками точек останова
+    def update_gutter(self):
+        count = int(self.text_area.index("end-1c").split(".")[0])
+        self.gutter.config(state=tk.NORMAL)
+        self.gutter.delete("1.0", tk.END)
+        for line in range(1, count + 1):
+            if line > 1:
+                self.gutter.insert(tk.END, "\n")
+            if line in self.breakpoint_lines:
+                self.gutter.insert(tk.END, f"●{line:>3}", "breakpoint")
+            else:
+                self.gutter.insert(tk.END, f" {line:>3}")
+        self.gutter.config(state=tk.DISABLED)
+        self.gutter.yview_moveto(self.text_area.yview()[0])
+
+    def _on_gutter_click(self, event):
+        line = int(self.gutter.index(f"@{event.x},{event.y}").split(".")[0])
+        self.breakpoint_lines ^= {line}
+        self.update_gutter()
+        self.apply_breakpoints()
+        return "break"
+
+    # Перенос точек останова со строк на адреса последней ассемблированной программы
+    def apply_breakpoints(self):
+        debugger = self.debugger
+        debugger.breakpoints = bytearray(len(debugger.breakpoints))
+        if self.object_code is not None:
+            for line in self.breakpoint_lines:
+                pc = self.object_code.pc_for_line(line)
+                if pc is not None and pc < len(debugger.breakpoints):
+                    debugger.breakpoints[pc] = 1
+        debugger.apply()
+
     def highlight_line(self, line):
         self.text_area.tag_remove("highlight", "1.0", tk.END)
         self.text_area.tag_add("highlight", f"{line}.0", f"{line}.end")
         self.text_area.tag_configure("highlight", background="yellow")
 
+    # Выделение строки команды, которая будет выполнена следующей
+    def highlight_pc(self, pc):
+        line = self.object_code.line_for_pc(pc) if self.object_code is not None else None
+        if line is None:
+            self.text_area.tag_remove("highlight", "1.0", tk.END)
+        else:
+            self.highlight_line(line)
+
 
 if __name__ == "__main__":
     root = tk.Tk()
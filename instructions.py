@@ -0,0 +1,18 @@
+# Классификация команд по мнемоникам, общая для эмулятора, компилятора
+# блоков, журнала, трассы, отладчика и модели конвейера. Модуль ничего
+# не импортирует, поэтому его может использовать любой другой модуль.
+# При добавлении команды в таблицы диспетчеризации processor.py её
+# мнемонику нужно добавить и сюда.
+
+# Команды, записывающие результат в rd (весь R-формат) и в rt
+WRITES_RD = frozenset(("ADD", "ADDU", "SUB", "SUBU", "AND", "OR", "XOR", "NOR"))
+WRITES_RT = frozenset(("ADDI", "ADDIU", "ANDI", "ORI", "XORI", "LW"))
+
+
+# Регистр, в который пишет команда entry, или None
+def destination(entry):
+    if entry.name in WRITES_RD:
+        return entry.rd
+    if entry.name in WRITES_RT:
+        return entry.rt
+    return None
@@ -0,0 +1,207 @@
+# Журнал выполнения для обратного хода.
+#
+# На каждый шаг записываются только pc, прежнее значение изменённого регистра
+# и прежнее значение изменённого слова памяти данных, поэтому шаг назад
+# выполняется за O(1). Каждые checkpoint_interval шагов сохраняется снимок
+# состояния: переход к произвольному шагу — восстановление ближайшего
+# снимка и повторное выполнение не более checkpoint_interval команд.
+#
+# Снимок хранит pc и регистры, а страницы памяти данных копируются в него
+# только перед первой записью в них после снимка. Поэтому стоимость снимка
+# пропорциональна числу изменённых страниц, а не объёму памяти данных
+# (в том числе отображённого образа). Возврат к снимку восстанавливает
+# сохранённые страницы всех более поздних снимков от новых к старым.
+# Когда журнал и снимки превышают memory_budget, самая старая история
+# отбрасывается целыми интервалами между снимками.
+
+from array import array
+
+from instructions import destination
+from memory import PAGE_BITS
+from processor import MachineState
+
+# Отсутствие изменённого регистра или слова памяти в записи
+_NONE = -1
+# Размер одной записи журнала: pc, регистр, его значение, адрес, слово памяти
+_RECORD_BYTES = 8 + 1 + 4 + 8 + 4
+
+
+class ExecutionJournal:
+    # Журнал подключается к эмулятору при создании; отключение — emulator.journal = None
+    def __init__(self, emulator, checkpoint_interval=1024, memory_budget=64 << 20):
+        if checkpoint_interval < 1:
+            raise ValueError("Интервал снимков должен быть положительным")
+        self.emulator = emulator
+        self.checkpoint_interval = checkpoint_interval
+        self.memory_budget = memory_budget
+        self.reset()
+        emulator.journal = self
+
+    # Очистка истории; текущее состояние эмулятора становится шагом 0
+    def reset(self):
+        self.position = 0  # номер текущего шага (каждая выполненная команда, включая STOP)
+        self.base = 0  # самый ранний шаг, к которому можно вернуться
+        self._pcs = array("q")
+        self._registers = array("b")
+        self._old_values = array("i")
+        self._addresses = array("q")
+        self._old_words = array("i")
+        # шаг -> MachineState; data_memory снимка — прежнее содержимое страниц
+        # (номер -> bytes или None), изменённых после него. По возрастанию шага
+        self.checkpoints = {}
+        self._costs = {}  # шаг -> байты, учтённые за снимком
+        self._checkpoint_bytes = 0
+        self._saved = None  # страницы последнего снимка
+
+    # Байты, занимаемые записями журнала и снимками
+    @property
+    def memory_used(self):
+        return len(self._pcs) * _RECORD_BYTES + self._checkpoint_bytes
+
+    # Запись шага перед выполнением команды entry по адресу pc
+    def record(self, pc, entry):
+        position = self.position
+        if position % self.checkpoint_interval == 0 and position not in self.checkpoints:
+            self._checkpoint(position)
+        emulator = self.emulator
+        register = destination(entry)
+        address = _NONE
+        old_value = old_word = 0
+        if register is not None:
+            old_value = emulator.registers[register]
+        else:
+            register = _NONE
+            if entry.name == "SW":
+                address = emulator.registers[entry.rs] + entry.imm
+                if 0 <= address < len(emulator.data_memory):
+                    old_word = emulator.data_memory.load(address)
+                    if address >> PAGE_BITS not in self._saved:
+                        self._save_page(address >> PAGE_BITS)
+        self._pcs.append(pc)
+        self._registers.append(register)
+        self._old_values.append(old_value)
+        self._addresses.append(address)
+        self._old_words.append(old_word)
+        self.position = position + 1
+
+    # Отмена последней записи, если команда завершилась ошибкой и не выполнилась
+    def discard(self):
+        for column in self._columns():
+            column.pop()
+        self.position -= 1
+
+    # Шаг назад; возвращает False, если история исчерпана
+    def step_back(self):
+        if self.position <= self.base:
+            return False
+        emulator = self.emulator
+        register = self._registers.pop()
+        old_value = self._old_values.pop()
+        address = self._addresses.pop()
+        old_word = self._old_words.pop()
+        if register != _NONE:
+            emulator.registers[register] = old_value
+        if address != _NONE:
+            emulator.data_memory.store(address, old_word)
+        emulator.pc = self._pcs.pop()
+        if self.position in self.checkpoints:
+            # Изменения после снимка отменены: страницы совпадают с сохранёнными
+            # в предыдущем снимке или не менялись после него
+            self._drop_checkpoint(self.position)
+            self._saved = self.checkpoints[next(reversed(self.checkpoints))].data_memory
+        self.position -= 1
+        return True
+
+    # Переход к шагу step: назад — через журнал или ближайший снимок,
+    # вперёд — выполнением команд. Возвращает причину остановки, если
+    # программа остановилась раньше, иначе None
+    def goto_step(self, step):
+        if step < self.base:
+            raise ValueError(f"Шаг {step} недоступен: история сохранена начиная с шага {self.base}")
+        if step < self.position:
+            checkpoint = max(c for c in self.checkpoints if c <= step)
+            if self.position - step <= step - checkpoint:
+                while self.position > step:
+                    self.step_back()
+                return None
+            self._rewind(checkpoint)
+        return self._replay(step)
+
+    def _columns(self):
+        return self._pcs, self._registers, self._old_values, self._addresses, self._old_words
+
+    # Возврат к снимку: записи и снимки после него отбрасываются
+    def _rewind(self, checkpoint):
+        emulator = self.emulator
+        later = [c for c in self.checkpoints if c >= checkpoint]
+        for position in reversed(later):
+            emulator.data_memory.restore_pages(self.checkpoints[position].data_memory)
+        state = self.checkpoints[checkpoint]
+        emulator.pc = state.pc
+        memoryview(emulator.registers).cast("B")[:] = state.registers
+        for column in self._columns():
+            del column[checkpoint - self.base:]
+        for position in later[1:]:
+            self._drop_checkpoint(position)
+        state.data_memory.clear()
+        self._checkpoint_bytes -= self._costs[checkpoint] - len(state.registers)
+        self._costs[checkpoint] = len(state.registers)
+        self._saved = state.data_memory
+        self.position = checkpoint
+
+    # Повторное выполнение до шага step без вызова trace_hook, без учёта
+    # в профилировщике и без ловушек отладчика: история уже пройдена
+    def _replay(self, step):
+        emulator = self.emulator
+        if self.position >= step:
+            return None
+        hook, emulator.trace_hook = emulator.trace_hook, None
+        profiler, emulator.profiler = emulator.profiler, None
+        debugger = emulator.debugger
+        try:
+            while self.position < step:
+                if debugger is not None:
+                    # Команда по адресу stopped_at выполняется без ловушки
+                    debugger.stopped_at = emulator.pc
+                reason = emulator.step()
+                if reason is not None:
+                    return reason
+        finally:
+            emulator.trace_hook = hook
+            emulator.profiler = profiler
+            if debugger is not None:
+                debugger.stopped_at = None
+        return None
+
+    # Снимок pc и регистров; страницы добавляются в него при первой записи
+    def _checkpoint(self, position):
+        emulator = self.emulator
+        self._saved = {}
+        state = MachineState(emulator.pc, emulator.registers.tobytes(), self._saved)
+        self.checkpoints[position] = state
+        self._costs[position] = len(state.registers)
+        self._checkpoint_bytes += len(state.registers)
+        self._trim()
+
+    # Сохранение страницы number в последний снимок перед первой записью в неё
+    def _save_page(self, number):
+        data = self.emulator.data_memory.page_bytes(number)
+        self._saved[number] = data
+        if data is not None:
+            self._costs[next(reversed(self.checkpoints))] += len(data)
+            self._checkpoint_bytes += len(data)
+            self._trim()
+
+    def _drop_checkpoint(self, position):
+        if position in self.checkpoints:
+            del self.checkpoints[position]
+            self._checkpoint_bytes -= self._costs.pop(position)
+
+    # Отбрасывание самой старой истории до укладывания в бюджет памяти
+    def _trim(self):
+        while self.memory_used > self.memory_budget and len(self.checkpoints) > 1:
+            self._drop_checkpoint(next(iter(self.checkpoints)))
+            following = next(iter(self.checkpoints))
+            for column in self._columns():
+                del column[:following - self.base]
+            self.base = following
@@ -0,0 +1,206 @@
+import sys
+from array import array
+
+from exceptions import MemoryAccessError
+
+# Размер страницы: 1024 слова (4 КиБ)
+PAGE_BITS = 10
+PAGE_WORDS = 1 << PAGE_BITS
+PAGE_MASK = PAGE_WORDS - 1
+
+# Полное 32-битное байтовое адресное пространство (4 ГиБ) в машинных словах
+FULL_RANGE_WORDS = 1 << 30
+
+# Буферы, копируемые в память как есть: сырые байты (bytes, bytearray) и
+# 32-битные целые в машинном порядке байтов
+_RAW_FORMATS = frozenset("bBc")
+_WORD_FORMATS = frozenset("iIlL")
+_NATIVE_PREFIXES = "@=" + ("<" if sys.byteorder == "little" else ">")
+
+
+# Байты слов data для копирования; буферы других форматов (int64, float
+# и т. п.) отвергаются, чтобы их байты не были приняты за слова
+def _word_bytes(data):
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return memoryview(array("i", data)).cast("B")
+    if view.format in _RAW_FORMATS or (view.itemsize == 4 and view.format.lstrip(_NATIVE_PREFIXES) in _WORD_FORMATS):
+        return view.cast("B")
+    raise TypeError(f"Ожидаются 32-битные целые в машинном порядке байтов, получен буфер формата '{view.format}'")
+
+
+# Разреженная страничная память данных с пословной адресацией.
+# Страницы выделяются при первой записи; чтение нетронутой страницы возвращает 0.
+# Страницей может быть и срез memoryview слов, например отображённого в
+# память файла (attach) — тогда данные не копируются.
+# Последняя использованная страница запоминается, как в TLB, чтобы
+# последовательные обращения не искали её в словаре.
+class PagedMemory:
+    def __init__(self, size=FULL_RANGE_WORDS):
+        if not 0 < size <= FULL_RANGE_WORDS:
+            raise ValueError(f"Размер памяти должен быть от 1 до {FULL_RANGE_WORDS} слов")
+        self.size = size
+        self.pages = {}  # номер страницы -> array('i') или memoryview('i')
+        self._last_number = None
+        self._last_page = None
+
+    def __len__(self):
+        return self.size
+
+    # Чтение слова
+    def load(self, address):
+        number = address >> PAGE_BITS
+        if number == self._last_number:
+            return self._last_page[address & PAGE_MASK]
+        if not 0 <= address < self.size:
+            raise MemoryAccessError(address, "read")
+        page = self.pages.get(number)
+        if page is None:
+            return 0
+        self._remember(number, page)
+        return page[address & PAGE_MASK]
+
+    # Запись слова
+    def store(self, address, value):
+        number = address >> PAGE_BITS
+        if number == self._last_number:
+            self._last_page[address & PAGE_MASK] = value
+            return
+        if not 0 <= address < self.size:
+            raise MemoryAccessError(address, "write")
+        page = self._page(number)
+        self._remember(number, page)
+        page[address & PAGE_MASK] = value
+
+    # Запоминаются только страницы, целиком лежащие в пределах памяти,
+    # чтобы быстрый путь не пропускал адреса за её концом
+    def _remember(self, number, page):
+        if (number + 1) << PAGE_BITS <= self.size:
+            self._last_number = number
+            self._last_page = page
+
+    def _page(self, number):
+        page = self.pages.get(number)
+        if page is None:
+            page = self.pages[number] = array("i", bytes(4 * PAGE_WORDS))
+        return page
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if step != 1:
+                return array("i", [self.load(i) for i in range(start, stop, step)])
+            return self.read(start, max(0, stop - start))
+        if index < 0:
+            index += self.size
+        return self.load(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if step != 1 or len(value) != max(0, stop - start):
+                raise ValueError("Поддерживается только запись непрерывного диапазона того же размера")
+            self.write(start, value)
+            return
+        if index < 0:
+            index += self.size
+        self.store(index, value)
+
+    # Чтение count слов начиная с address одним массивом
+    def read(self, address, count):
+        if count < 0 or address < 0 or address + count > self.size:
+            raise MemoryAccessError(address if address < 0 else address + count - 1, "read")
+        result = array("i")
+        while count > 0:
+            number = address >> PAGE_BITS
+            offset = address & PAGE_MASK
+            n = min(count, PAGE_WORDS - offset)
+            page = self.pages.get(number)
+            if page is None:
+                result.frombytes(bytes(4 * n))
+            else:
+                result.frombytes(memoryview(page)[offset:offset + n].cast("B"))
+            address += n
+            count -= n
+        return result
+
+    # Запись слов из объекта с буферным протоколом (32-битные целые или сырые
+    # байты) или последовательности целых начиная с address; данные копируются
+    # постранично без поэлементных объектов
+    def write(self, address, data):
+        source = _word_bytes(data)
+        if source.nbytes % 4:
+            raise ValueError("Размер данных не кратен машинному слову")
+        count = source.nbytes // 4
+        if address < 0 or address + count > self.size:
+            raise MemoryAccessError(address if address < 0 else address + count - 1, "write")
+        position = 0
+        while position < count:
+            number = address >> PAGE_BITS
+            offset = address & PAGE_MASK
+            n = min(count - position, PAGE_WORDS - offset)
+            target = memoryview(self._page(number)).cast("B")
+            target[offset * 4:(offset + n) * 4] = source[position * 4:(position + n) * 4]
+            address += n
+            position += n
+
+    # Подключение слов view (memoryview формата 'i') начиная с address без
+    # копирования: целые страницы становятся страницами памяти, неполные
+    # края копируются
+    def attach(self, address, view):
+        count = len(view)
+        if address < 0 or address + count > self.size:
+            raise MemoryAccessError(address if address < 0 else address + count - 1, "write")
+        head = min(count, -address & PAGE_MASK)
+        if head:
+            self.write(address, view[:head])
+        position = head
+        address += head
+        while count - position >= PAGE_WORDS:
+            self.pages[address >> PAGE_BITS] = view[position:position + PAGE_WORDS]
+            address += PAGE_WORDS
+            position += PAGE_WORDS
+        if position < count:
+            self.write(address, view[position:])
+        self._last_number = None
+        self._last_page = None
+
+    # Адрес за последней выделенной страницей (не больше размера памяти)
+    def allocated_end(self):
+        if not self.pages:
+            return 0
+        return min(self.size, (max(self.pages) + 1) << PAGE_BITS)
+
+    # Количество выделенных страниц и занимаемые ими байты
+    @property
+    def nbytes(self):
+        return len(self.pages) * PAGE_WORDS * 4
+
+    # Копия выделенных страниц: {номер страницы: bytes}
+    def snapshot(self):
+        return {number: page.tobytes() for number, page in self.pages.items()}
+
+    def restore(self, pages):
+        self.pages = {number: array("i", data) for number, data in pages.items()}
+        self._last_number = None
+        self._last_page = None
+
+    # Копия страницы number (None, если страница не выделена)
+    def page_bytes(self, number):
+        page = self.pages.get(number)
+        return None if page is None else bytes(memoryview(page).cast("B"))
+
+    # Возврат страниц к копиям page_bytes на месте (отображённые страницы
+    # остаются отображёнными); None удаляет страницу
+    def restore_pages(self, pages):
+        for number, data in pages.items():
+            if data is None:
+                self.pages.pop(number, None)
+            else:
+                memoryview(self._page(number)).cast("B")[:] = data
+        self._last_number = None
+        self._last_page = None
+
+    def clear(self):
+        self.restore({})
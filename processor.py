@@ -1,147 +1,667 @@
-from exceptions import EmptyException
+import logging
+import sys
+import time
+from array import array
+from collections import namedtuple
+from dataclasses import dataclass
+
+from compiler import BlockCompiler
+from dataimage import map_image, read_image, write_image
+from exceptions import EmptyException, MemoryAccessError
+from fusion import fuse
+from memory import FULL_RANGE_WORDS, PagedMemory
+
+logger = logging.getLogger(__name__)
+
+# Предекодированная команда: обработчик и уже извлечённые поля.
+# Для переходов в imm хранится абсолютный адрес цели.
+DecodedInstruction = namedtuple("DecodedInstruction", ["handler", "rs", "rt", "rd", "imm", "name"])
+
+# Причины остановки выполнения
+HALT_STOP = "stop"  # встречена команда STOP
+HALT_END = "end"  # выход за пределы памяти команд
+HALT_MAX_STEPS = "max_steps"  # исчерпан лимит шагов
+HALT_MAX_TIME = "max_time"  # исчерпан лимит времени
+HALT_FAULT = "fault"  # недопустимое обращение к памяти данных
+HALT_BREAKPOINT = "breakpoint"  # сработала ловушка отладчика (debugger.Debugger)
+
+STOP_WORD = 0xFFFFFFFF
+
+# Служебные значения, которые обработчики возвращают вместо адреса перехода
+_STOP = -1
+_END = -2
+# Ловушки отладчика: остановка до выполнения команды и после него
+BREAK = -3
+BREAK_AFTER = -4
+
+# Форматы буферов целых, которые load_data приводит к 32-битным словам
+_WIDE_INTEGER_FORMATS = frozenset("hHlLqQnN")
+
+# Как часто (в командах) проверяется лимит времени
+_TIME_CHECK_INTERVAL = 4096
+# То же для скомпилированных блоков (в блоках)
+_BLOCK_TIME_CHECK_INTERVAL = 256
+
+
+# Результат выполнения программы до остановки
+@dataclass
+class RunResult:
+    reason: str
+    steps: int
+    pc: int
+    fault: MemoryAccessError = None
+
+
+# Снимок состояния машины: копии буферов регистров и выделенных страниц памяти
+MachineState = namedtuple("MachineState", ["pc", "registers", "data_memory"])
+
+
+# Приведение целого к 32-битному знаковому слову (переполнение по модулю 2**32)
+def wrap32(value):
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+# Трассировка в журнал: подключается через emulator.trace_hook = log_trace
+def log_trace(emulator, pc, entry, address):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    word = emulator.instruction_memory[pc]
+    message = f"pc: {pc} {word:#010x} {entry.name} imm: {entry.imm}"
+    if address is not None:
+        message += f" address: {address * 4}"
+    logger.debug("%s %s", message, list(emulator.registers[:5]))
+
+
+# Память команд (массив беззнаковых 32-битных слов), сообщающая эмулятору
+# о каждой записи, чтобы он мог обновить предекодированные команды
+class InstructionMemory(array):
+    def __new__(cls, size, on_write=None):
+        return super().__new__(cls, "I", bytes(4 * size))
+
+    def __init__(self, size, on_write=None):
+        self.on_write = on_write
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        if self.on_write is not None:
+            self.on_write(index)
+
 
 class EmulatorMIPS:
     # инициализация регистров, cmem, dmem и программного счётчика
-    def __init__(self):
-        # каждая ячейка равна машинному слову (32 бита)
-        self.registers = [0] * 32
-        self.instruction_memory = [0] * 256
-        self.data_memory = [0] * 1024
+    def __init__(self, instruction_words=256, data_words=FULL_RANGE_WORDS):
+        # каждая ячейка равна машинному слову (32 бита); значения в регистрах
+        # и памяти данных — знаковые, в памяти команд — беззнаковые.
+        # Память данных страничная: память тратится только на затронутые страницы.
+        # instruction_words — наименьший размер памяти команд: load_program
+        # увеличивает её до размера программы
+        self.registers = array("i", bytes(4 * 32))
+        self.instruction_words = instruction_words
+        self.instruction_memory = InstructionMemory(instruction_words, self._invalidate)
+        self.data_memory = PagedMemory(data_words)
         self.pc = 0
+        # Вызывается после каждой команды: trace_hook(emulator, pc, entry, address)
+        self.trace_hook = None
+        # Журнал для обратного хода (journal.ExecutionJournal) или None
+        self.journal = None
+        # Профилировщик (profiler.Profiler) или None
+        self.profiler = None
+        self._debugger = None
+        # Слияние частых пар команд в run_until_halt (fusion.py)
+        self._fusion = True
+        self._fused = None  # таблица слитых команд, строится при первом запуске
+        self._fusion_stats = None
+        self._compiler = BlockCompiler(self, logger)
+        self._decode_all()
+
+    # Отладчик (debugger.Debugger) или None. Смена отладчика заново декодирует
+    # память команд, поэтому ловушки прежнего отладчика не остаются в таблице
+    @property
+    def debugger(self):
+        return self._debugger
+
+    @debugger.setter
+    def debugger(self, debugger):
+        self._debugger = debugger
+        self._decode_all()
 
-    # Старт выполнения программы
+    # Выполнение одной команды (совместимость: остановка сигнализируется исключением)
     def run(self):
-        print(f"Starting command {self.pc}")
-        # while True:
-        print(f"\npc: {self.pc}")
-        # получает операцию из массива команд
-        instruction = self.fetch()
-        if instruction == 0xFFFFFFFF:  # Команда остановки
-            print("\nProgram finished (STOP command encountered)")
+        if self.step() == HALT_STOP:
             raise EmptyException
-            # break
-        if instruction is None or instruction == 0x0:
-            print("\nEmpty command encountered stopping the process")
-            return
-            # break
-        print(hex(instruction))
-        opcode, rs, rt, rd, imm = self.decode(instruction)
-        self.execute(opcode, rs, rt, rd, imm)
-        print(self.registers[:5])
+
+    # Выполняет одну команду; возвращает причину остановки или None.
+    # Ошибка обращения к памяти данных выбрасывается как MemoryAccessError
+    def step(self):
+        pc = self.pc
+        if not 0 <= pc < len(self.instruction_memory):
+            return HALT_END
+        entry = self._decoded[pc]
+        debugger = self.debugger
+        if debugger is not None and debugger.stopped_at is not None:
+            # Команда, перед которой сработала ловушка, выполняется без неё
+            if debugger.stopped_at == pc:
+                entry = debugger.original(pc)
+            debugger.stopped_at = None
+        hook = self.trace_hook
+        profiler = self.profiler
+        address = None
+        if (hook is not None or profiler is not None) and entry.name in ("LW", "SW"):
+            address = self.registers[entry.rs] + entry.imm
+        journal = self.journal
+        if journal is not None:
+            journal.record(pc, entry)
+        if profiler is not None:
+            profiler.record(pc, entry, address)
+        self.pc = pc + 1
+        try:
+            target = entry.handler(self, entry.rs, entry.rt, entry.rd, entry.imm)
+        except Exception as error:
+            if journal is not None:
+                journal.discard()
+            if isinstance(error, MemoryAccessError):
+                error.pc = pc
+            raise
+        if target is not None and target < _END:
+            if target == BREAK:
+                self.pc = pc
+                if journal is not None:
+                    journal.discard()
+                if profiler is not None:
+                    profiler.record(pc, entry, address, -1)
+                return HALT_BREAKPOINT
+            if hook is not None:
+                hook(self, pc, entry, address)
+            return HALT_BREAKPOINT
+        if target is not None and target != _STOP:
+            self.pc = target
+            if profiler is not None:
+                profiler.taken[pc] += 1
+        elif target == _STOP and profiler is not None:
+            profiler.record(pc, entry, address, -1)  # STOP не считается шагом
+        if hook is not None:
+            hook(self, pc, entry, address)
+        return HALT_STOP if target == _STOP else None
+
+    # Выполнение до остановки в пределах лимитов шагов и времени (секунды)
+    def run_until_halt(self, max_steps=None, max_time=None):
+        limit = sys.maxsize if max_steps is None else max_steps
+        deadline = None if max_time is None else time.perf_counter() + max_time
+        if self.trace_hook is not None or self.journal is not None:
+            return self._run_observed(limit, deadline)
+        if self.debugger is not None and self.debugger.stopped_at is not None and limit > 0:
+            # Первая команда — та, на которой остановилась ловушка, — выполняется шагом
+            first = self._run_observed(1, None)
+            if first.reason != HALT_MAX_STEPS or limit == 1:
+                return first
+            result = self.run_until_halt(limit - 1, max_time)
+            result.steps += 1
+            return result
+        if self.profiler is not None:
+            return self._run_profiled(limit, deadline)
+
+        decoded = self._decoded
+        fused = self._fused if self._fused is not None else self._fuse()
+        size = len(decoded) - 1
+        pc = self.pc
+        if not 0 <= pc < size:
+            return RunResult(HALT_END, 0, pc)
+        interval = limit if deadline is None else _TIME_CHECK_INTERVAL
+        steps = 0
+        length = 1
+        target = None
+        try:
+            while True:
+                # Слитая пара выполняет два шага, поэтому последний шаг
+                # в пределах лимита выполняется по обычной таблице
+                stop_at = min(limit - 1, steps + interval)
+                while steps < stop_at:
+                    handler, rs, rt, rd, imm, length = fused[pc]
+                    pc += length
+                    steps += length
+                    target = handler(self, rs, rt, rd, imm)
+                    if target is not None:
+                        if target < 0:
+                            break
+                        pc = target
+                        target = None
+                if target is None and steps == limit - 1:
+                    handler, rs, rt, rd, imm, _ = decoded[pc]
+                    length = 1
+                    pc += 1
+                    steps += 1
+                    target = handler(self, rs, rt, rd, imm)
+                    if target is not None and target >= 0:
+                        pc = target
+                        target = None
+                if target is not None:
+                    steps -= 1
+                    if target == _STOP:
+                        return RunResult(HALT_STOP, steps, pc)
+                    if target == BREAK:
+                        pc -= 1
+                        return RunResult(HALT_BREAKPOINT, steps, pc)
+                    if target == BREAK_AFTER:
+                        return RunResult(HALT_BREAKPOINT, steps + 1, pc)
+                    pc = size
+                    return RunResult(HALT_END, steps, pc)
+                if steps >= limit:
+                    return RunResult(HALT_MAX_STEPS, steps, pc)
+                if time.perf_counter() >= deadline:
+                    return RunResult(HALT_MAX_TIME, steps, pc)
+        except MemoryAccessError as error:
+            # Ошибку вызывает первая команда слитой пары, до изменения состояния
+            pc -= length - 1
+            error.pc = pc - 1
+            return RunResult(HALT_FAULT, steps - length, pc, error)
+        finally:
+            self.pc = pc
+
+    # Выполнение через скомпилированные базовые блоки; результат совпадает с run_until_halt
+    def run_compiled(self, max_steps=None, max_time=None):
+        if self.trace_hook is not None or self.journal is not None or self.profiler is not None:
+            return self.run_until_halt(max_steps, max_time)
+        limit = sys.maxsize if max_steps is None else max_steps
+        deadline = None if max_time is None else time.perf_counter() + max_time
+        compiler = self._compiler
+        blocks = compiler.blocks
+        size = len(self.instruction_memory)
+        if not 0 <= self.pc < size:
+            return RunResult(HALT_END, 0, self.pc)
+        steps = 0
+        executed_blocks = 0
+        while True:
+            pc = self.pc
+            if steps >= limit:
+                return RunResult(HALT_MAX_STEPS, steps, pc)
+            if not 0 <= pc < size:
+                self.pc = size
+                return RunResult(HALT_END, steps, size)
+            block = blocks.get(pc) or compiler.get(pc)
+            if block is None or steps + block.length > limit:
+                # Команда не компилируется или блок не укладывается в лимит шагов
+                try:
+                    reason = self.step()
+                except MemoryAccessError as error:
+                    return RunResult(HALT_FAULT, steps, self.pc, error)
+                if reason is not None:
+                    return RunResult(reason, steps + self._executed(reason), self.pc)
+                steps += 1
+            else:
+                budget = limit - steps if deadline is None else min(limit - steps, _TIME_CHECK_INTERVAL)
+                try:
+                    target, count = block.function(self, self.registers, self.data_memory, budget)
+                except MemoryAccessError as error:
+                    # Блок уже записал регистры и pc; учитываем выполненные до ошибки команды
+                    error.pc = self.pc - 1
+                    return RunResult(HALT_FAULT, steps + self._compiler.fault_steps, self.pc, error)
+                steps += count
+                if target < 0:
+                    self.pc = block.end
+                    return RunResult(HALT_STOP, steps, self.pc)
+                self.pc = target
+            executed_blocks += 1
+            if deadline is not None and executed_blocks % _BLOCK_TIME_CHECK_INTERVAL == 0 \
+                    and time.perf_counter() >= deadline:
+                return RunResult(HALT_MAX_TIME, steps, self.pc)
+
+    # Цикл run_until_halt со счётчиками профилировщика: выполнения и переходы
+    # по адресам команд, обращения LW/SW — через обработчики из profiler.instrument
+    def _run_profiled(self, limit, deadline):
+        profiler = self.profiler
+        decoded = profiler.instrument(self._decoded)
+        hits = profiler.hits
+        taken = profiler.taken
+        size = len(decoded) - 1
+        pc = self.pc
+        if not 0 <= pc < size:
+            return RunResult(HALT_END, 0, pc)
+        interval = limit if deadline is None else _TIME_CHECK_INTERVAL
+        steps = 0
+        target = None
+        try:
+            while True:
+                stop_at = min(limit, steps + interval)
+                while steps < stop_at:
+                    handler, rs, rt, rd, imm, _ = decoded[pc]
+                    hits[pc] += 1
+                    pc += 1
+                    steps += 1
+                    target = handler(self, rs, rt, rd, imm)
+                    if target is not None:
+                        if target < 0:
+                            break
+                        taken[pc - 1] += 1
+                        pc = target
+                        target = None
+                if target is not None:
+                    steps -= 1
+                    if target == _STOP:
+                        hits[pc - 1] -= 1  # STOP не считается шагом
+                        return RunResult(HALT_STOP, steps, pc)
+                    if target == BREAK:
+                        pc -= 1
+                        entry = self._decoded[pc]
+                        address = self.registers[entry.rs] + entry.imm if entry.name in ("LW", "SW") else None
+                        profiler.record(pc, entry, address, -1)
+                        return RunResult(HALT_BREAKPOINT, steps, pc)
+                    if target == BREAK_AFTER:
+                        return RunResult(HALT_BREAKPOINT, steps + 1, pc)
+                    hits[size] = 0  # ограничитель конца памяти — не команда
+                    pc = size
+                    return RunResult(HALT_END, steps, pc)
+                if steps >= limit:
+                    return RunResult(HALT_MAX_STEPS, steps, pc)
+                if time.perf_counter() >= deadline:
+                    return RunResult(HALT_MAX_TIME, steps, pc)
+        except MemoryAccessError as error:
+            error.pc = pc - 1
+            return RunResult(HALT_FAULT, steps - 1, pc, error)
+        finally:
+            self.pc = pc
+
+    # Медленный путь с вызовом trace_hook и записью журнала на каждой команде
+    def _run_observed(self, limit, deadline):
+        if not 0 <= self.pc < len(self.instruction_memory):
+            return RunResult(HALT_END, 0, self.pc)
+        steps = 0
+        while steps < limit:
+            try:
+                reason = self.step()
+            except MemoryAccessError as error:
+                return RunResult(HALT_FAULT, steps, self.pc, error)
+            if reason is not None:
+                return RunResult(reason, steps + self._executed(reason), self.pc)
+            steps += 1
+            if deadline is not None and steps % _TIME_CHECK_INTERVAL == 0 and time.perf_counter() >= deadline:
+                return RunResult(HALT_MAX_TIME, steps, self.pc)
+        return RunResult(HALT_MAX_STEPS, steps, self.pc)
+
+    # Слияние пар команд можно отключить, например для сравнения скорости
+    @property
+    def fusion(self):
+        return self._fusion
+
+    @fusion.setter
+    def fusion(self, enabled):
+        self._fusion = enabled
+        self._fused = None
+
+    # Построение таблицы слитых команд для текущей таблицы предекодированных
+    def _fuse(self):
+        self._fused, self._fusion_stats = fuse(self._decoded, _HANDLER_NAMES if self.fusion else {},
+                                               logger.warning)
+        return self._fused
+
+    # Число слитых пар команд в загруженной программе по видам ("ADDI+BNE": n)
+    def fusion_stats(self):
+        if self._fused is None:
+            self._fuse()
+        return dict(self._fusion_stats)
+
+    # 1, если остановка по ловушке отладчика произошла после выполнения команды
+    def _executed(self, reason):
+        debugger = self.debugger
+        return int(reason == HALT_BREAKPOINT and debugger is not None and debugger.last_hit.executed)
 
     def execute(self, opcode, rs, rt, rd, imm):
-        print("Command executing")
+        # Декодирование для команды по текущему адресу (pc уже указывает на следующую)
+        instruction = (opcode << 26) | (rs << 21) | (rt << 16) | (rd << 11) | (imm & 0xFFFF)
+        entry = self.predecode(instruction, self.pc - 1)
+        target = entry.handler(self, entry.rs, entry.rt, entry.rd, entry.imm)
+        if target is not None and target >= 0:
+            self.pc = target
+
+    # Обработчики команд. Переходы возвращают новый pc, остальные — None
+
+    def _exec_add(self, rs, rt, rd, imm):
+        regs = self.registers
+        res = regs[rs] + regs[rt]
+        # Проверка переполнения
+        if -0x80000000 <= res <= 0x7FFFFFFF:
+            regs[rd] = res
+        else:
+            logger.warning("Overflow detected in ADD operation")
+
+    def _exec_addu(self, rs, rt, rd, imm):  # сложение без учета переполнения
+        regs = self.registers
+        regs[rd] = ((regs[rs] + regs[rt] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+    def _exec_sub(self, rs, rt, rd, imm):
+        regs = self.registers
+        res = regs[rs] - regs[rt]
+        # Проверка переполнения
+        if -0x80000000 <= res <= 0x7FFFFFFF:
+            regs[rd] = res
+        else:
+            logger.warning("Overflow detected in SUB operation")
+
+    def _exec_subu(self, rs, rt, rd, imm):  # вычитание без учета переполнения
+        regs = self.registers
+        regs[rd] = ((regs[rs] - regs[rt] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+    def _exec_and(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rd] = regs[rs] & regs[rt]
+
+    def _exec_or(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rd] = regs[rs] | regs[rt]
+
+    def _exec_xor(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rd] = regs[rs] ^ regs[rt]
+
+    def _exec_nor(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rd] = ~(regs[rs] | regs[rt])
+
+    def _exec_j(self, rs, rt, rd, imm):  # безусловный переход
+        return imm
+
+    def _exec_beq(self, rs, rt, rd, imm):
+        if self.registers[rs] == self.registers[rt]:
+            return imm
+
+    def _exec_bne(self, rs, rt, rd, imm):
+        if self.registers[rs] != self.registers[rt]:
+            return imm
+
+    def _exec_addi(self, rs, rt, rd, imm):  # арифметика с непосредственным значением
+        regs = self.registers
+        result = regs[rs] + imm
+        # Проверка переполнения
+        if -0x80000000 <= result <= 0x7FFFFFFF:
+            regs[rt] = result
+        else:
+            logger.warning("Overflow detected in ADDI operation")
+
+    def _exec_addiu(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rt] = ((regs[rs] + imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+    def _exec_andi(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rt] = regs[rs] & imm
+
+    def _exec_ori(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rt] = regs[rs] | imm
+
+    def _exec_xori(self, rs, rt, rd, imm):
+        regs = self.registers
+        regs[rt] = regs[rs] ^ imm
+
+    def _exec_lw(self, rs, rt, rd, imm):  # загрузка из памяти данных
+        regs = self.registers
+        regs[rt] = self.data_memory.load(regs[rs] + imm)
+
+    def _exec_sw(self, rs, rt, rd, imm):  # сохранение в память данных
+        regs = self.registers
+        self.data_memory.store(regs[rs] + imm, regs[rt])
+
+    def _exec_nop(self, rs, rt, rd, imm):  # пустая команда (0x0)
+        pass
+
+    def _exec_stop(self, rs, rt, rd, imm):
+        return _STOP
+
+    def _exec_end(self, rs, rt, rd, imm):  # за последней ячейкой памяти команд
+        return _END
+
+    def _exec_invalid(self, rs, rt, rd, imm):
+        raise ValueError(f"Неизвестная инструкция: {hex(imm)}")
+
+    def _exec_invalid_r(self, rs, rt, rd, imm):
+        raise ValueError(f"Неизвестная R-инструкция: {hex(imm)}")
+
+    # Таблицы диспетчеризации: funct для R-формата и opcode для остальных
+    _funct_table = {
+        0x20: ("ADD", _exec_add),
+        0x21: ("ADDU", _exec_addu),
+        0x22: ("SUB", _exec_sub),
+        0x23: ("SUBU", _exec_subu),
+        0x24: ("AND", _exec_and),
+        0x25: ("OR", _exec_or),
+        0x26: ("XOR", _exec_xor),
+        0x27: ("NOR", _exec_nor),
+    }
+    _opcode_table = {
+        0x02: ("J", _exec_j),
+        0x04: ("BEQ", _exec_beq),
+        0x05: ("BNE", _exec_bne),
+        0x08: ("ADDI", _exec_addi),
+        0x09: ("ADDIU", _exec_addiu),
+        0x0C: ("ANDI", _exec_andi),
+        0x0D: ("ORI", _exec_ori),
+        0x0E: ("XORI", _exec_xori),
+        0x23: ("LW", _exec_lw),
+        0x2B: ("SW", _exec_sw),
+    }
+
+    # Однократное декодирование слова, лежащего по адресу address
+    def predecode(self, instruction, address):
+        if instruction == STOP_WORD:  # Команда остановки
+            return DecodedInstruction(EmulatorMIPS._exec_stop, 0, 0, 0, 0, "STOP")
+        if instruction == 0x0:  # Пустая команда
+            return DecodedInstruction(EmulatorMIPS._exec_nop, 0, 0, 0, 0, "NOP")
+        opcode, rs, rt, rd, imm = self.decode(instruction)
         if imm & 0x8000:  # Если старший бит 16-битного imm установлен
-            imm |= 0xFFFF0000  # Расширяем старшие биты
-            imm = imm - 0x100000000
-        print(f"imm: {imm}")
-        # Выполняет инструкцию в зависимости от старших битов
-        match opcode:
-            case 0x00:  # R-формат
-                func = imm & 0x3F
-                match func:
-                    case 0x20:  # ADD
-                        print("ADD")
-                        res = self.registers[rs] + self.registers[rt]
-                        # Проверка переполнения
-                        if (self.registers[rs] > 0 > res and self.registers[rt] > 0) or \
-                                (self.registers[rs] < 0 < res and self.registers[rt] < 0):
-                            print("Overflow detected in ADD operation")
-                        else:
-                            self.registers[rd] = res
-                    case 0x21:  # ADDU (сложение без учета переполнения)
-                        print("ADDU")
-                        self.registers[rd] = (self.registers[rs] + self.registers[rt]) & 0xFFFFFFFF
-                    case 0x22:  # SUB
-                        print("SUB")
-                        res = self.registers[rs] - self.registers[rt]
-                        # Проверка переполнения
-                        if (self.registers[rs] > 0 > self.registers[rt] and res < 0) or \
-                                (self.registers[rs] < 0 < self.registers[rt] and res > 0):
-                            print("Overflow detected in SUB operation")
-                        else:
-                            self.registers[rd] = res
-                    case 0x23:  # SUBU (вычитание без учета переполнения)
-                        print("SUBU")
-                        self.registers[rd] = (self.registers[rs] - self.registers[rt]) & 0xFFFFFFFF
-                    case 0x24:  # AND
-                        print("AND")
-                        self.registers[rd] = self.registers[rs] & self.registers[rt]
-                    case 0x25:  # OR
-                        print("OR")
-                        self.registers[rd] = self.registers[rs] | self.registers[rt]
-                    case 0x26:  # XOR
-                        print("XOR")
-                        self.registers[rd] = self.registers[rs] ^ self.registers[rt]
-                    case 0x27:  # NOR
-                        print("NOR")
-                        self.registers[rd] = ~(self.registers[rs] | self.registers[rt]) & 0xFFFFFFFF
-                    case _:
-                        raise ValueError(f"Неизвестная R-инструкция: {hex(func)}")
-            case 0x02:  # безусловный переход
-                print("J")
-                target = imm & 0x3FFFFFF
-                self.pc = target
-            case 0x04:  # BEQ
-                print("BEQ")
-                if self.registers[rs] == self.registers[rt]:
-                    imm = imm & 0xFFFF
-                    self.pc += imm
-            case 0x05:  # BNE
-                print("BNE")
-                if self.registers[rs] != self.registers[rt]:
-                    self.pc += imm
-            case 0x08:  # арифметика с непосредственным значением
-                print("ADDI")
-                result = self.registers[rs] + imm
-                # Проверка переполнения
-                if (self.registers[rs] > 0 > result and imm > 0) or \
-                        (self.registers[rs] < 0 < result and imm < 0):
-                    print("Overflow detected in ADDI operation")
-                else:
-                    self.registers[rt] = result
-            case 0x09:  # ADDIU
-                print("ADDIU")
-                self.registers[rt] = self.registers[rs] + imm
-                print(f"Result: {self.registers[rt]}")
-            case 0x0C:  # ANDI
-                print("ANDI")
-                self.registers[rt] = self.registers[rs] & imm
-                print(f"Result: {self.registers[rt]}")
-            case 0x0D:  # ORI
-                print("ORI")
-                self.registers[rt] = self.registers[rs] | imm
-                print(f"Result: {self.registers[rt]}")
-            case 0x0E:  # XORI
-                print("XORI")
-                self.registers[rt] = self.registers[rs] ^ imm
-                print(f"Result: {self.registers[rt]}")
-            case 0x23:  # загрузка из памяти данных
-                print("LW")
-                address = (self.registers[rs] + imm)
-                self.registers[rt] = self.data_memory[address]
-                print(f"Loaded value: {self.registers[rt]} from address: {address * 4}")
-            case 0x2B:  # сохранение в память данных
-                print("SW")
-                address = (self.registers[rs] + imm)
-                self.data_memory[address] = self.registers[rt]
-                print(f"Stored value: {self.registers[rt]} to address: {address * 4}")
-            case _:
-                raise ValueError(f"Неизвестная инструкция: {hex(opcode)}")
-
-    # Загрузка программы в память команд
+            imm -= 0x10000  # Расширяем знак
+        if opcode == 0x00:  # R-формат
+            func = imm & 0x3F
+            if func not in self._funct_table:
+                return DecodedInstruction(EmulatorMIPS._exec_invalid_r, rs, rt, rd, func, "?")
+            name, handler = self._funct_table[func]
+            return DecodedInstruction(handler, rs, rt, rd, imm, name)
+        if opcode not in self._opcode_table:
+            return DecodedInstruction(EmulatorMIPS._exec_invalid, rs, rt, rd, opcode, "?")
+        name, handler = self._opcode_table[opcode]
+        # Адрес перехода вычисляется один раз; выход за пределы памяти команд
+        # приводится к её концу, где выборка завершает программу
+        if name == "J":
+            imm = self._branch_target(instruction & 0x3FFFFFF)
+        elif name == "BEQ" or name == "BNE":
+            imm = self._branch_target(address + 1 + imm)
+        return DecodedInstruction(handler, rs, rt, rd, imm, name)
+
+    def _branch_target(self, target):
+        size = len(self.instruction_memory)
+        return target if 0 <= target < size else size
+
+    # Обновление предекодированных команд после записи в память команд
+    def _invalidate(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self.instruction_memory)))
+        else:
+            indices = [index % len(self.instruction_memory)]
+        for i in indices:
+            self._decoded[i] = self.predecode(self.instruction_memory[i], i)
+            self._compiler.invalidate(i)
+        self._fused = None
+        if self.debugger is not None:
+            self.debugger.apply()
+
+    # Декодирование всей памяти команд; последний элемент — ограничитель конца памяти
+    def _decode_all(self):
+        self._decoded = [self.predecode(cmd, i) for i, cmd in enumerate(self.instruction_memory)]
+        self._decoded.append(DecodedInstruction(EmulatorMIPS._exec_end, 0, 0, 0, 0, "END"))
+        self._compiler.reset()
+        self._fused = None
+        if self.debugger is not None:
+            self.debugger.apply()
+
+    # Загрузка программы в память команд; память команд по размеру программы,
+    # но не меньше instruction_words
     def load_program(self, program):
-        print("Start of incoming programm")
         self.pc = 0
-        self.instruction_memory = [0] * 256
-        for i, cmd in enumerate(program):
-            if i < len(self.instruction_memory):
-                self.instruction_memory[i] = cmd
-                print(hex(cmd))
-            else:
-                print("Программа превышает размер командной памяти")
-                return
-        print("Program successfully loaded\n")
+        words = array("I", program)
+        size = max(self.instruction_words, len(words))
+        self.instruction_memory = InstructionMemory(size, self._invalidate)
+        array.__setitem__(self.instruction_memory, slice(0, len(words)), words)
+        self._decode_all()
+        if self.journal is not None:
+            self.journal.reset()
+        if self.profiler is not None:
+            self.profiler.reset()
+        if self.debugger is not None:
+            self.debugger.stopped_at = None
+        logger.debug("Program loaded: %d words", len(words))
+
+    # Запись слов в память данных начиная с адреса offset. Буферы 32-битных
+    # целых (array, memoryview, массивы NumPy int32/uint32) и bytes копируются
+    # постранично без поэлементных объектов; целые другой разрядности (int64
+    # NumPy по умолчанию) и последовательности приводятся к словам поэлементно.
+    # Буферы нецелых типов вызывают TypeError
+    def load_data(self, data, offset=0):
+        try:
+            view = memoryview(data)
+        except TypeError:
+            data = array("i", [wrap32(value) for value in data])
+        else:
+            code = view.format.lstrip("@")
+            if view.itemsize != 4 and code in _WIDE_INTEGER_FORMATS:
+                data = array("i", [wrap32(value) for value in view.cast("B").cast(code)])
+        self.data_memory.write(offset, data)
+        if self.journal is not None:
+            self.journal.reset()
+
+    # Загрузка образа памяти данных (.npy или двоичный файл слов) с копированием
+    def load_data_image(self, path, offset=0, byteorder="little"):
+        self.load_data(read_image(path, byteorder), offset)
+
+    # Отображение образа памяти данных в память без копирования: страницы файла
+    # становятся страницами памяти данных. writable=True записывает изменения
+    # в файл, иначе они видны только этому эмулятору
+    def map_data_image(self, path, offset=0, byteorder="little", writable=False):
+        self.data_memory.attach(offset, map_image(path, byteorder, writable))
+        if self.journal is not None:
+            self.journal.reset()
+
+    # Сохранение памяти данных в образ; по умолчанию — до конца последней
+    # выделенной страницы. Возвращает число записанных слов
+    def save_data_image(self, path, start=0, count=None, byteorder="little"):
+        return write_image(path, self.data_memory, start, count, byteorder)
+
+    # Представления состояния без копирования (только для чтения);
+    # память данных представлена выделенными страницами
+    def state_views(self):
+        return {
+            "registers": memoryview(self.registers).toreadonly(),
+            "instruction_memory": memoryview(self.instruction_memory).toreadonly(),
+            "data_pages": {number: memoryview(page).toreadonly()
+                           for number, page in self.data_memory.pages.items()},
+        }
+
+    # Снимок регистров, pc и памяти данных
+    def snapshot(self):
+        return MachineState(self.pc, self.registers.tobytes(), self.data_memory.snapshot())
+
+    # Восстановление состояния из снимка
+    def restore(self, state):
+        self.pc = state.pc
+        memoryview(self.registers).cast("B")[:] = state.registers
+        self.data_memory.restore(state.data_memory)
 
     # Извлекает текущую команду из памяти команд
     def fetch(self):
@@ -161,6 +681,11 @@ class EmulatorMIPS:
         return opcode, rs, rt, rd, imm
 
 
+# Мнемоники исходных обработчиков команд (слияние пар в fusion.py)
+_HANDLER_NAMES = {handler: name for name, handler in
+                  (*EmulatorMIPS._funct_table.values(), *EmulatorMIPS._opcode_table.values())}
+
+
 # Инициализация
 #emulator = EmulatorMIPS()
 #disassembler = DisassemblerMIPS()
@@ -0,0 +1,178 @@
+# Профилировщик программ MIPS.
+#
+# Подключается к эмулятору при создании (emulator.profiler = None отключает его).
+# Пока профилировщик не подключён, эмулятор выполняется без изменений;
+# подключённый — run_until_halt использует цикл со счётчиками выполнений
+# по адресам, а LW/SW считаются по адресам данных.
+# Гистограмма команд, статистика переходов и горячие циклы вычисляются
+# из счётчиков по адресам после выполнения.
+
+from collections import Counter, namedtuple
+
+# Обратный переход, замыкающий цикл: тело — адреса start..end включительно
+HotLoop = namedtuple("HotLoop", ["start", "end", "iterations", "instructions"])
+
+_CONDITIONAL = ("BEQ", "BNE")
+
+
+# Обработчик LW/SW, считающий обращения по адресам данных
+def _counting(handler, counts):
+    def counted(emulator, rs, rt, rd, imm):
+        address = emulator.registers[rs] + imm
+        counts[address] = counts.get(address, 0) + 1
+        return handler(emulator, rs, rt, rd, imm)
+    return counted
+
+
+class Profiler:
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.reset()
+        emulator.profiler = self
+
+    # Обнуление счётчиков; размер соответствует текущей памяти команд
+    def reset(self):
+        size = len(self.emulator._decoded)
+        self.hits = [0] * size  # адрес -> число выполнений
+        self.taken = [0] * size  # адрес -> число выполненных переходов
+        self.loads = {}  # адрес данных -> число LW
+        self.stores = {}  # адрес данных -> число SW
+
+    # Учёт одной команды при пошаговом выполнении (EmulatorMIPS.step);
+    # count = -1 отменяет учёт команды, не выполненной из-за ловушки отладчика
+    def record(self, pc, entry, address, count=1):
+        self.hits[pc] += count
+        if entry.name in ("LW", "SW"):
+            counts = self.loads if entry.name == "LW" else self.stores
+            counts[address] = counts.get(address, 0) + count
+            if not counts[address]:
+                del counts[address]
+
+    # Копия таблицы декодированных команд с подсчётом обращений LW/SW
+    def instrument(self, decoded):
+        table = list(decoded)
+        for pc, entry in enumerate(table):
+            if entry.name == "LW":
+                table[pc] = entry._replace(handler=_counting(entry.handler, self.loads))
+            elif entry.name == "SW":
+                table[pc] = entry._replace(handler=_counting(entry.handler, self.stores))
+        return table
+
+    @property
+    def total(self):
+        return sum(self.hits)
+
+    # Число выполнений по мнемоникам
+    def opcode_histogram(self):
+        histogram = Counter()
+        for entry, count in zip(self.emulator._decoded, self.hits):
+            if count:
+                histogram[entry.name] += count
+        return histogram
+
+    # Условные переходы: адрес -> (выполнен, не выполнен)
+    def branch_stats(self):
+        return {pc: (self.taken[pc], self.hits[pc] - self.taken[pc])
+                for pc, entry in enumerate(self.emulator._decoded)
+                if entry.name in _CONDITIONAL and self.hits[pc]}
+
+    # Самые часто выполняемые адреса: [(адрес, число выполнений)]
+    def hot_spots(self, count=10):
+        ranked = sorted((n, pc) for pc, n in enumerate(self.hits) if n)
+        return [(pc, n) for n, pc in reversed(ranked[-count:])]
+
+    # Циклы — выполнявшиеся обратные переходы, по убыванию числа команд в теле
+    def hot_loops(self, count=10):
+        loops = []
+        for pc, entry in enumerate(self.emulator._decoded):
+            if entry.name in ("J",) + _CONDITIONAL and entry.imm <= pc and self.taken[pc]:
+                instructions = sum(self.hits[entry.imm:pc + 1])
+                loops.append(HotLoop(entry.imm, pc, self.taken[pc], instructions))
+        loops.sort(key=lambda loop: loop.instructions, reverse=True)
+        return loops[:count]
+
+    # Число выполненных команд по строкам исходного текста (ObjectCode.lines)
+    def line_hits(self, object_code):
+        counts = Counter()
+        for pc, count in enumerate(self.hits):
+            line = object_code.line_for_pc(pc)
+            if count and line is not None:
+                counts[line] += count
+        return counts
+
+    # Ближайшая метка не дальше адреса pc для группировки адресов по функциям
+    def _functions(self, object_code):
+        starts = sorted((address, label) for label, address in object_code.symbols.items())
+        names = []
+        current = "main"
+        index = 0
+        for pc in range(len(self.hits)):
+            while index < len(starts) and starts[index][0] <= pc:
+                current = starts[index][1]
+                index += 1
+            names.append(current)
+        return names
+
+    # Экспорт в формате callgrind (KCachegrind, gprof2dot): событие —
+    # выполненные команды, позиции — строки исходного файла, функции — метки
+    def write_callgrind(self, file, object_code, source="program.asm"):
+        names = self._functions(object_code)
+        file.write("# callgrind format\nversion: 1\ncreator: mips32-emulator\n")
+        file.write("positions: line\nevents: Instructions\n")
+        file.write(f"summary: {self.total}\n\nfl={source}\n")
+        function = None
+        for pc, count in enumerate(self.hits):
+            if not count:
+                continue
+            if names[pc] != function:
+                function = names[pc]
+                file.write(f"fn={function}\n")
+            file.write(f"{object_code.line_for_pc(pc) or 0} {count}\n")
+
+    # Экспорт в свёрнутые стеки (flamegraph.pl, speedscope):
+    # "программа;метка;команда@строка число"
+    def write_collapsed(self, file, object_code, source="program.asm"):
+        names = self._functions(object_code)
+        decoded = self.emulator._decoded
+        for pc, count in enumerate(self.hits):
+            if count:
+                line = object_code.line_for_pc(pc) or 0
+                file.write(f"{source};{names[pc]};{decoded[pc].name}@{line} {count}\n")
+
+    # Исходный текст с числом выполнений и долей для каждой строки
+    def annotate(self, source, object_code):
+        counts = self.line_hits(object_code)
+        total = self.total or 1
+        result = []
+        for number, text in enumerate(source.splitlines(), 1):
+            count = counts.get(number)
+            if count:
+                result.append(f"{count:>12} {100 * count / total:6.2f}% | {text}")
+            else:
+                result.append(f"{'':>12} {'':>7} | {text}")
+        return "\n".join(result)
+
+    # Текстовый отчёт: горячие адреса, циклы, команды, переходы и обращения к памяти
+    def report(self, object_code=None, count=10):
+        decoded = self.emulator._decoded
+        total = self.total or 1
+        lines = [f"Выполнено команд: {self.total}", "", "Горячие адреса:"]
+        for pc, n in self.hot_spots(count):
+            line = object_code.line_for_pc(pc) if object_code is not None else None
+            where = f" (строка {line})" if line is not None else ""
+            lines.append(f"  pc {pc}{where}: {decoded[pc].name} {n} ({100 * n / total:.1f}%)")
+        lines += ["", "Горячие циклы:"]
+        for loop in self.hot_loops(count):
+            lines.append(f"  pc {loop.start}..{loop.end}: итераций {loop.iterations}, "
+                         f"команд {loop.instructions} ({100 * loop.instructions / total:.1f}%)")
+        lines += ["", "Команды:"]
+        for name, n in self.opcode_histogram().most_common():
+            lines.append(f"  {name}: {n}")
+        lines += ["", "Условные переходы (выполнен / не выполнен):"]
+        for pc, (taken, not_taken) in self.branch_stats().items():
+            lines.append(f"  pc {pc} {decoded[pc].name}: {taken} / {not_taken}")
+        for title, counts in (("Чтения памяти (LW):", self.loads), ("Записи в память (SW):", self.stores)):
+            lines += ["", title]
+            for address, n in Counter(counts).most_common(count):
+                lines.append(f"  Mem[{address * 4}]: {n}")
+        return "\n".join(lines)
@@ -0,0 +1,200 @@
+# Пакетный запуск программ без графического интерфейса.
+#
+# Каждая программа ассемблируется один раз, затем все пары
+# (программа, образ памяти данных) выполняются в пуле процессов.
+# Результаты выводятся построчно в формате JSON Lines.
+#
+# Двоичные образы (.bin, .npy) с --map не копируются в рабочие процессы:
+# каждый процесс отображает файл в память, и операционная система разделяет
+# его страницы между процессами.
+#
+# Пример:
+#   python runner.py array_sum.asm summ_from_mem.asm --data input.bin --workers 8 --dump 0:8
+#   python runner.py array_sum.asm --data big.npy --map --save-data out/
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from dataimage import map_image, read_image
+from disassembler import DisassemblerMIPS
+from memory import FULL_RANGE_WORDS
+from processor import EmulatorMIPS
+from timing import TimingModel, parse_cache
+from tracefile import RingTrace, TraceWriter
+
+# Программы и образы памяти, переданные рабочему процессу при запуске
+_programs = None
+_images = None
+_options = None
+
+
+# Образы .bin (32-битные слова) и .npy загружаются как двоичные
+def is_binary_image(path):
+    return path.endswith((".bin", ".npy"))
+
+
+# Чтение образа памяти данных: двоичный образ в порядке байтов byteorder,
+# иначе текст с целыми числами через пробелы или переводы строк
+def read_data_image(path, byteorder="little"):
+    if is_binary_image(path):
+        return read_image(path, byteorder)
+    with open(path) as file:
+        return array("i", [int(token, 0) for token in file.read().split()])
+
+
+# Ассемблирование программы с кэшем объектного кода: слова и ошибки
+# ассемблера. Ошибки также выводятся в stderr, а программа с ошибками
+# не выполняется — её записи получают halt_reason "assembly_error"
+def assemble(path):
+    code = DisassemblerMIPS().assemble_file_cached(path)
+    for error in code.errors:
+        print(f"{path}:{error.line}: {error.message}", file=sys.stderr)
+    errors = [{"line": error.line, "text": error.text, "message": error.message} for error in code.errors]
+    return code.words.tolist(), errors
+
+
+def _init_worker(programs, images, options):
+    global _programs, _images, _options
+    _programs, _images, _options = programs, images, options
+
+
+# Выполнение одной пары (программа, образ) в рабочем процессе
+def run_job(job):
+    program_index, image_index = job
+    path, (words, errors) = _programs[program_index]
+    record = {"program": path, "data": None if image_index is None else _images[image_index][0]}
+    if errors:
+        record.update(halt_reason="assembly_error", assembly_errors=errors, steps=None, pc=None)
+        return record
+    emulator = EmulatorMIPS()
+    emulator.load_program(words)
+    if image_index is not None:
+        image_path, image = _images[image_index]
+        if image is None:
+            emulator.map_data_image(image_path, byteorder=_options["byteorder"])
+        else:
+            emulator.load_data(image)
+    run = emulator.run_compiled if _options["compiled"] else emulator.run_until_halt
+    timing = None
+    if _options["timing"]:
+        timing = TimingModel(forwarding=_options["forwarding"], cache=_options["cache"])
+        run = lambda **limits: timing.run(emulator, **limits)
+    trace = None
+    if _options["trace"] is not None:
+        # Трасса пишется в каталог --trace; при --trace-last хранятся только последние шаги
+        record["trace"] = os.path.join(_options["trace"], f"job{program_index}_{image_index}.trc")
+        trace = RingTrace(_options["trace_last"]) if _options["trace_last"] else TraceWriter(record["trace"])
+        emulator.trace_hook = trace
+    try:
+        result = run(max_steps=_options["max_steps"], max_time=_options["max_time"])
+    except Exception as error:
+        record.update(halt_reason="error", error=str(error), steps=None, pc=emulator.pc)
+    else:
+        record.update(halt_reason=result.reason, steps=result.steps, pc=result.pc)
+        if result.fault is not None:
+            record["fault"] = {"address": result.fault.address, "access": result.fault.access,
+                               "pc": result.fault.pc}
+    finally:
+        if isinstance(trace, RingTrace):
+            trace.save(record["trace"])
+        elif trace is not None:
+            trace.close()
+    if timing is not None:
+        record["timing"] = timing.summary()
+    record["registers"] = emulator.registers.tolist()
+    record["memory"] = [{"start": start, "words": emulator.data_memory.read(start, count).tolist()}
+                        for start, count in _options["dump"]]
+    if _options["save_data"] is not None:
+        record["saved_data"] = os.path.join(_options["save_data"], f"job{program_index}_{image_index}.bin")
+        emulator.save_data_image(record["saved_data"], byteorder=_options["byteorder"])
+    return record
+
+
+# Диапазон памяти для вывода: "start:count"
+def parse_range(text):
+    start, _, count = text.partition(":")
+    return int(start, 0), int(count or "1", 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный запуск программ MIPS")
+    parser.add_argument("programs", nargs="+", help="файлы .asm")
+    parser.add_argument("--data", nargs="*", default=[],
+                        help="образы памяти данных (.bin или текст); каждый запускается с каждой программой")
+    parser.add_argument("--byteorder", choices=("little", "big"), default="little",
+                        help="порядок байтов двоичных образов .bin (и сохраняемых образов)")
+    parser.add_argument("--map", action="store_true",
+                        help="отображать двоичные образы в память без копирования")
+    parser.add_argument("--save-data", help="каталог для образов памяти данных после выполнения")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--chunksize", type=int, default=16, help="заданий на одну передачу процессу")
+    parser.add_argument("--max-steps", type=int, default=10_000_000, help="лимит шагов на запуск")
+    parser.add_argument("--max-time", type=float, default=None, help="лимит времени на запуск, секунды")
+    parser.add_argument("--dump", type=parse_range, action="append", default=[],
+                        help="диапазон памяти данных для вывода, start:count (можно повторять)")
+    parser.add_argument("--compiled", action="store_true", help="выполнять через компиляцию блоков")
+    parser.add_argument("--timing", action="store_true",
+                        help="оценивать такты моделью конвейера и кэша данных")
+    parser.add_argument("--no-forwarding", action="store_true", help="модель конвейера без проброса")
+    parser.add_argument("--cache", type=parse_cache, default="4096:16:2:lru:10",
+                        help="кэш данных size:line:ways[:lru|fifo[:штраф промаха]]; байты, такты")
+    parser.add_argument("--trace", help="каталог для двоичных трасс выполнения (по файлу на запуск)")
+    parser.add_argument("--trace-last", type=int, help="сохранять в трассе только последние N шагов")
+    parser.add_argument("-o", "--output", help="файл для результатов (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    for start, count in args.dump:
+        if count < 0 or start < 0 or start + count > FULL_RANGE_WORDS:
+            parser.error(f"Диапазон --dump {start}:{count} выходит за пределы памяти данных "
+                         f"({FULL_RANGE_WORDS} слов)")
+    programs = [(path, assemble(path)) for path in args.programs]
+    if args.map:
+        text_images = [path for path in args.data if not is_binary_image(path)]
+        if text_images:
+            parser.error(f"--map поддерживает только двоичные образы: {', '.join(text_images)}")
+        for path in args.data:
+            try:
+                map_image(path, args.byteorder)
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+    images = [(path, None if args.map else read_data_image(path, args.byteorder)) for path in args.data]
+    options = {"max_steps": args.max_steps, "max_time": args.max_time, "dump": args.dump,
+               "compiled": args.compiled, "timing": args.timing, "forwarding": not args.no_forwarding,
+               "cache": args.cache, "trace": args.trace, "trace_last": args.trace_last,
+               "byteorder": args.byteorder, "save_data": args.save_data}
+    if args.trace is not None:
+        if args.timing:
+            parser.error("--trace и --timing используют один trace_hook и несовместимы")
+        os.makedirs(args.trace, exist_ok=True)
+    if args.save_data is not None:
+        os.makedirs(args.save_data, exist_ok=True)
+    jobs = list(itertools.product(range(len(programs)), range(len(images)) if images else [None]))
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.workers <= 1 or len(jobs) == 1:
+            _init_worker(programs, images, options)
+            results = map(run_job, jobs)
+            _write_results(results, output)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                     initargs=(programs, images, options)) as executor:
+                _write_results(executor.map(run_job, jobs, chunksize=args.chunksize), output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def _write_results(results, output):
+    for record in results:
+        output.write(json.dumps(record, separators=(",", ":")) + "\n")
+        output.flush()
+
+
+if __name__ == "__main__":
+    main()
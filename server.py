@@ -0,0 +1,450 @@
+# Сервер сеансов эмулятора: много изолированных эмуляторов в одном процессе.
+#
+# Протокол — JSON-RPC 2.0 поверх TCP, по одному JSON-объекту на строку.
+# Каждый запрос соединения обрабатывается отдельной задачей, поэтому долгий
+# запуск не задерживает ответы на другие запросы; ответы сопоставляются по id.
+# Методы:
+#   create {step_budget?, time_budget?}      -> {session, budget}
+#   close {session}
+#   assemble {session, source}              -> {words, symbols, errors}
+#   load {session, words?, data?, offset?}   -> {words}; без words — последняя ассемблированная программа
+#   run {session, max_steps?, max_time?}     -> {halt_reason, steps, pc, fault?, budget}
+#   step {session, count?}                   -> то же, что run
+#   state {session, memory?: [[start, count]]} -> {pc, registers, memory, budget}
+#
+# Некорректные параметры (в том числе адреса за пределами памяти данных и
+# значения, не помещающиеся в слово) возвращают ошибку INVALID_PARAMS.
+# state отдаёт не больше MAX_STATE_WORDS слов памяти за запрос. Строка
+# запроса или ответа не длиннее MAX_MESSAGE_BYTES байт; на более длинный
+# запрос возвращается ошибка INVALID_REQUEST, а соединение сохраняется.
+#
+# У каждого сеанса есть бюджет шагов и времени выполнения; запуск
+# ограничивается остатком бюджета. Эмуляторы берутся из пула и после
+# закрытия сеанса (или разрыва соединения, создавшего его) сбрасываются и
+# возвращаются в пул. Запуски длиннее INLINE_STEPS шагов, ассемблирование
+# текста длиннее INLINE_SOURCE_CHARS символов и загрузка больше
+# INLINE_LOAD_WORDS слов выполняются в пуле потоков, чтобы цикл событий
+# не блокировался. assemble принимает не больше MAX_SOURCE_CHARS символов,
+# load — не больше MAX_LOAD_WORDS слов программы и столько же слов данных.
+#
+# Пример:
+#   python server.py --port 8765 --pool 64 --workers 4
+
+import argparse
+import asyncio
+import json
+import logging
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from disassembler import DisassemblerMIPS
+from exceptions import MemoryAccessError
+from processor import EmulatorMIPS
+
+logger = logging.getLogger(__name__)
+
+# Запуски не длиннее стольких шагов, а также ассемблирование и загрузка
+# не больше стольких символов и слов выполняются прямо в цикле событий
+INLINE_STEPS = 10_000
+INLINE_SOURCE_CHARS = 1 << 16
+INLINE_LOAD_WORDS = 1 << 14
+# Наибольший исходный текст assemble и наибольшее число слов программы
+# или данных в запросе load
+MAX_SOURCE_CHARS = 1 << 21
+MAX_LOAD_WORDS = 1 << 20
+# Наибольшее число слов памяти данных в одном ответе state
+MAX_STATE_WORDS = 1 << 16
+# Наибольшая длина строки JSON-RPC в байтах: с запасом вмещает ответ state
+# и исходный текст или программу в несколько мегабайт
+MAX_MESSAGE_BYTES = 16 << 20
+
+# Коды ошибок JSON-RPC
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SESSION_NOT_FOUND = -32000
+BUDGET_EXHAUSTED = -32001
+POOL_EXHAUSTED = -32002
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(code, message)
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+# Пул эмуляторов: возвращённый эмулятор сбрасывается и выдаётся следующему сеансу
+class EmulatorPool:
+    def __init__(self, size, instruction_words=256):
+        self.size = size
+        self.instruction_words = instruction_words
+        self.free = []
+        self.created = 0
+
+    def acquire(self):
+        if self.free:
+            return self.free.pop()
+        if self.created >= self.size:
+            raise RpcError(POOL_EXHAUSTED, "Нет свободных эмуляторов")
+        self.created += 1
+        return EmulatorMIPS(instruction_words=self.instruction_words)
+
+    def release(self, emulator):
+        emulator.trace_hook = emulator.journal = emulator.profiler = emulator.debugger = None
+        emulator.load_program([])
+        _clear_registers(emulator)
+        emulator.data_memory.clear()
+        self.free.append(emulator)
+
+
+class Session:
+    def __init__(self, emulator, step_budget, time_budget):
+        self.id = secrets.token_hex(8)
+        self.emulator = emulator
+        self.steps_left = step_budget
+        self.time_left = time_budget
+        self.object_code = None
+        self.lock = asyncio.Lock()  # один запрос к эмулятору сеанса одновременно
+
+    def budget(self):
+        return {"steps": self.steps_left, "time": self.time_left}
+
+
+class SessionServer:
+    def __init__(self, pool_size=64, workers=4, step_budget=10_000_000, time_budget=10.0,
+                 instruction_words=256):
+        self.pool = EmulatorPool(pool_size, instruction_words)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.step_budget = step_budget  # наибольший бюджет сеанса
+        self.time_budget = time_budget
+        self.sessions = {}
+        self._server = None
+        self._methods = {
+            "create": self.create, "close": self.close, "assemble": self.assemble,
+            "load": self.load, "run": self.run, "step": self.step, "state": self.state,
+        }
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._serve_connection, host, port,
+                                                  limit=MAX_MESSAGE_BYTES)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for session_id in list(self.sessions):
+            await self._close(session_id)
+        self.executor.shutdown(wait=False)
+
+    # Обработка одного соединения: запросы выполняются параллельно, ответы
+    # пишутся по мере готовности
+    async def _serve_connection(self, reader, writer):
+        owned = set()  # сеансы, созданные этим соединением
+        tasks = set()
+        write_lock = asyncio.Lock()
+
+        async def send(response):
+            async with write_lock:
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+
+        async def respond(line):
+            response = await self.handle(line, owned)
+            if response is not None:
+                await send(response)
+
+        try:
+            while True:
+                try:
+                    line = await _read_line(reader)
+                except asyncio.LimitOverrunError:
+                    # id слишком длинного запроса неизвестен: ответ без id
+                    await _skip_line(reader)
+                    await send({"jsonrpc": "2.0", "id": None, "error": {
+                        "code": INVALID_REQUEST, "message": f"Запрос длиннее {MAX_MESSAGE_BYTES} байт"}})
+                    continue
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for session_id in owned:
+                await self._close(session_id)
+            writer.close()
+
+    # Разбор и выполнение одного запроса; None для уведомлений (без id)
+    async def handle(self, line, owned=None):
+        request_id = None
+        notification = False
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RpcError(PARSE_ERROR, "Некорректный JSON")
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise RpcError(INVALID_REQUEST, "Некорректный запрос")
+            request_id = request.get("id")
+            notification = "id" not in request
+            method = self._methods.get(request["method"])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"Неизвестный метод: {request['method']}")
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "Параметры должны быть объектом")
+            try:
+                result = await method(**params)
+            except (TypeError, ValueError, OverflowError, MemoryAccessError) as error:
+                # Ошибки выполнения программы возвращаются в результате run,
+                # поэтому эти исключения вызваны значениями параметров
+                raise RpcError(INVALID_PARAMS, str(error))
+            if request["method"] == "create" and owned is not None:
+                owned.add(result["session"])
+            elif request["method"] == "close" and owned is not None:
+                owned.discard(params.get("session"))
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RpcError as error:
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": error.code, "message": error.message}}
+        except Exception as error:
+            logger.exception("Ошибка обработки запроса")
+            response = {"jsonrpc": "2.0", "id": request_id, "error": {"code": INTERNAL_ERROR, "message": str(error)}}
+        if notification:
+            return None
+        return response
+
+    def _session(self, session):
+        try:
+            return self.sessions[session]
+        except (KeyError, TypeError):
+            raise RpcError(SESSION_NOT_FOUND, f"Сеанс не найден: {session}")
+
+    # Закрытие сеанса; эмулятор возвращается в пул после завершения текущего запроса
+    async def _close(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            async with session.lock:
+                self.pool.release(session.emulator)
+
+    # Вызов function(*args) в пуле потоков, если offload, иначе прямо в цикле событий
+    async def _call(self, offload, function, *args):
+        if not offload:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    # Методы JSON-RPC
+
+    async def create(self, step_budget=None, time_budget=None):
+        steps = self.step_budget if step_budget is None else min(int(step_budget), self.step_budget)
+        seconds = self.time_budget if time_budget is None else min(float(time_budget), self.time_budget)
+        session = Session(self.pool.acquire(), steps, seconds)
+        self.sessions[session.id] = session
+        return {"session": session.id, "budget": session.budget()}
+
+    async def close(self, session):
+        self._session(session)
+        await self._close(session)
+        return True
+
+    async def assemble(self, session, source):
+        current = self._session(session)
+        if not isinstance(source, str) or len(source) > MAX_SOURCE_CHARS:
+            raise RpcError(INVALID_PARAMS, f"Исходный текст должен быть строкой не длиннее {MAX_SOURCE_CHARS} символов")
+        # Ассемблер хранит состояние разбора, поэтому у каждого вызова свой
+        object_code = await self._call(len(source) > INLINE_SOURCE_CHARS, DisassemblerMIPS().assemble, source)
+        current.object_code = object_code
+        return {
+            "words": object_code.words.tolist(),
+            "symbols": object_code.symbols,
+            "errors": [{"line": error.line, "text": error.text, "message": error.message}
+                       for error in object_code.errors],
+        }
+
+    async def load(self, session, words=None, data=None, offset=0):
+        current = self._session(session)
+        if words is None:
+            if current.object_code is None:
+                raise RpcError(INVALID_PARAMS, "Нет ассемблированной программы")
+            if current.object_code.errors:
+                raise RpcError(INVALID_PARAMS, "Программа ассемблирована с ошибками")
+            words = current.object_code.words
+        size = max(len(words), 0 if data is None else len(data))
+        if size > MAX_LOAD_WORDS:
+            raise RpcError(INVALID_PARAMS, f"Можно загрузить не больше {MAX_LOAD_WORDS} слов программы и данных")
+        async with current.lock:
+            await self._call(size > INLINE_LOAD_WORDS, _load, current.emulator, words, data, offset)
+        return {"words": len(words)}
+
+    async def run(self, session, max_steps=None, max_time=None):
+        current = self._session(session)
+        async with current.lock:
+            if current.steps_left <= 0 or current.time_left <= 0:
+                raise RpcError(BUDGET_EXHAUSTED, "Бюджет сеанса исчерпан")
+            limit = current.steps_left if max_steps is None else min(int(max_steps), current.steps_left)
+            seconds = current.time_left if max_time is None else min(float(max_time), current.time_left)
+            started = time.perf_counter()
+            record = await self._call(limit > INLINE_STEPS, _execute, current.emulator, limit, seconds)
+            current.time_left = max(0.0, current.time_left - (time.perf_counter() - started))
+            current.steps_left -= record["steps"] or 0
+            record["budget"] = current.budget()
+            return record
+
+    async def step(self, session, count=1):
+        return await self.run(session, max_steps=count)
+
+    async def state(self, session, memory=()):
+        current = self._session(session)
+        ranges = [(int(start), int(count)) for start, count in memory]
+        if any(count < 0 for _, count in ranges) or sum(count for _, count in ranges) > MAX_STATE_WORDS:
+            raise RpcError(INVALID_PARAMS, f"Можно запросить от 0 до {MAX_STATE_WORDS} слов памяти")
+        async with current.lock:
+            emulator = current.emulator
+            return {
+                "pc": emulator.pc,
+                "registers": emulator.registers.tolist(),
+                "memory": [{"start": start, "words": emulator.data_memory.read(start, count).tolist()}
+                           for start, count in ranges],
+                "budget": current.budget(),
+            }
+
+
+# Чтение строки до перевода строки; b"" в конце потока. Строка длиннее
+# лимита потока остаётся в буфере и выбрасывает LimitOverrunError
+async def _read_line(reader):
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+
+
+# Пропуск оставшейся части слишком длинной строки вместе с переводом строки
+async def _skip_line(reader):
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+
+
+def _clear_registers(emulator):
+    memoryview(emulator.registers).cast("B")[:] = bytes(4 * len(emulator.registers))
+
+
+def _load(emulator, words, data, offset):
+    emulator.load_program(words)
+    _clear_registers(emulator)
+    if data is not None:
+        emulator.load_data(data, offset)
+
+
+# Запуск эмулятора с лимитами; результат в виде записи как в runner.py
+def _execute(emulator, max_steps, max_time):
+    try:
+        result = emulator.run_until_halt(max_steps, max_time)
+    except Exception as error:
+        return {"halt_reason": "error", "error": str(error), "steps": None, "pc": emulator.pc}
+    record = {"halt_reason": result.reason, "steps": result.steps, "pc": result.pc}
+    if result.fault is not None:
+        record["fault"] = {"address": result.fault.address, "access": result.fault.access,
+                           "pc": result.fault.pc}
+    return record
+
+
+# Клиент для локального использования и проверки сервера
+class SessionClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+        self._pending = {}
+        self._listener = asyncio.create_task(self._listen())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE_BYTES)
+        return cls(reader, writer)
+
+    async def _listen(self):
+        try:
+            while True:
+                line = await _read_line(self.reader)
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except (ConnectionError, asyncio.LimitOverrunError) as error:
+            logger.error("Чтение ответов сервера прервано: %s", error)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Соединение закрыто"))
+
+    # Вызов метода; ошибка сервера выбрасывается как RpcError
+    async def call(self, method, **params):
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        self.writer.write(json.dumps(message).encode() + b"\n")
+        await self.writer.drain()
+        response = await future
+        if "error" in response:
+            raise RpcError(response["error"]["code"], response["error"]["message"])
+        return response["result"]
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._listener.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер сеансов эмулятора MIPS (JSON-RPC по TCP)")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес (по умолчанию только локальный)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool", type=int, default=64, help="наибольшее число одновременных сеансов")
+    parser.add_argument("--workers", type=int, default=4, help="потоков для долгих запусков")
+    parser.add_argument("--step-budget", type=int, default=10_000_000, help="бюджет шагов сеанса")
+    parser.add_argument("--time-budget", type=float, default=10.0, help="бюджет времени сеанса, секунды")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        server = SessionServer(args.pool, args.workers, args.step_budget, args.time_budget)
+        host, port = await server.start(args.host, args.port)
+        logger.info("Сервер сеансов слушает %s:%d", host, port)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Проверка сервера сеансов через SessionClient.
+#
+# Сервер запускается в этом же процессе на свободном порту. Проверяются
+# запросы и ответы длиннее 64 КиБ (лимит строки asyncio по умолчанию):
+# ассемблирование большого исходного текста, загрузка большого массива
+# данных и ответ state на MAX_STATE_WORDS слов. Запрос длиннее
+# MAX_MESSAGE_BYTES должен получить ошибку INVALID_REQUEST, после которой
+# соединение и его сеансы продолжают работать. Большое ассемблирование
+# выполняется в пуле потоков и не задерживает ответы другим сеансам, а
+# текст длиннее MAX_SOURCE_CHARS и загрузка больше MAX_LOAD_WORDS слов
+# отклоняются с ошибкой INVALID_PARAMS.
+#
+# Пример:
+#   python servertest.py
+
+import asyncio
+import json
+import logging
+import sys
+
+from server import (INVALID_PARAMS, INVALID_REQUEST, MAX_LOAD_WORDS, MAX_MESSAGE_BYTES, MAX_SOURCE_CHARS,
+                    MAX_STATE_WORDS, RpcError, SessionClient, SessionServer)
+
+# Размер, заведомо превышающий лимит строки asyncio по умолчанию
+DEFAULT_LIMIT = 64 * 1024
+
+
+def check(failures, name, condition):
+    print(f"{'ok    ' if condition else 'ОШИБКА'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+async def check_large_messages(client, failures):
+    session = (await client.call("create"))["session"]
+    lines = ["ADDI R1, R1, 1"] * 6000
+    source = "\n".join(lines)
+    check(failures, f"исходный текст {len(source)} байт", len(source) > DEFAULT_LIMIT)
+    object_code = await client.call("assemble", session=session, source=source)
+    check(failures, "assemble большого текста",
+          len(object_code["words"]) == len(lines) + 1 and not object_code["errors"])
+
+    data = list(range(-10_000, 10_000))
+    check(failures, f"данные {len(json.dumps(data))} байт", len(json.dumps(data)) > DEFAULT_LIMIT)
+    loaded = await client.call("load", session=session, data=data)
+    check(failures, "load больших данных", loaded["words"] == len(lines) + 1)
+    result = await client.call("run", session=session)
+    check(failures, "run", result["halt_reason"] == "stop" and result["steps"] == len(lines))
+
+    state = await client.call("state", session=session, memory=[[0, MAX_STATE_WORDS]])
+    words = state["memory"][0]["words"]
+    check(failures, "state на MAX_STATE_WORDS слов",
+          state["registers"][1] == len(lines) and words[:len(data)] == data and len(words) == MAX_STATE_WORDS)
+    await client.call("close", session=session)
+
+
+async def check_size_limits(client, failures):
+    session = (await client.call("create"))["session"]
+    other = (await client.call("create"))["session"]
+    source = "ADDI R1, R1, 1\n" * (MAX_SOURCE_CHARS // 15)
+    assembling = asyncio.create_task(client.call("assemble", session=session, source=source))
+    await client.call("state", session=other)
+    check(failures, "state во время большого assemble", not assembling.done())
+    object_code = await assembling
+    check(failures, "assemble MAX_SOURCE_CHARS символов", not object_code["errors"])
+    loaded = await client.call("load", session=session)
+    check(failures, "load большой программы", loaded["words"] == len(object_code["words"]))
+
+    for name, method, params in (
+            ("assemble длиннее MAX_SOURCE_CHARS", "assemble", {"source": source + "NOP\n"}),
+            ("load больше MAX_LOAD_WORDS слов", "load", {"words": [0] * (MAX_LOAD_WORDS + 1)})):
+        try:
+            await client.call(method, session=session, **params)
+        except RpcError as error:
+            check(failures, name, error.code == INVALID_PARAMS)
+        else:
+            check(failures, name, False)
+    await client.call("close", session=session)
+    await client.call("close", session=other)
+
+
+async def check_overlong_request(host, port, failures):
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE_BYTES)
+    try:
+        create = {"jsonrpc": "2.0", "id": 1, "method": "create"}
+        writer.write(json.dumps(create).encode() + b"\n")
+        session = json.loads(await reader.readline())["result"]["session"]
+        request = {"jsonrpc": "2.0", "id": 2, "method": "assemble",
+                   "params": {"session": session, "source": "NOP\n" * (MAX_MESSAGE_BYTES // 4)}}
+        writer.write(json.dumps(request).encode() + b"\n")
+        response = json.loads(await reader.readline())
+        check(failures, "запрос длиннее MAX_MESSAGE_BYTES",
+              response["id"] is None and response["error"]["code"] == INVALID_REQUEST)
+        state = {"jsonrpc": "2.0", "id": 3, "method": "state", "params": {"session": session}}
+        writer.write(json.dumps(state).encode() + b"\n")
+        response = json.loads(await reader.readline())
+        check(failures, "соединение и сеанс после длинного запроса", response.get("id") == 3 and "result" in response)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run_checks():
+    server = SessionServer(pool_size=4, workers=2)
+    host, port = await server.start()
+    failures = []
+    try:
+        client = await SessionClient.connect(host, port)
+        try:
+            await check_large_messages(client, failures)
+            await check_size_limits(client, failures)
+        finally:
+            await client.close()
+        await check_overlong_request(host, port, failures)
+    finally:
+        await server.stop()
+    return failures
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    failures = asyncio.run(run_checks())
+    print(f"Проверок с ошибками: {len(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# Модель времени выполнения: классический конвейер IF/ID/EX/MEM/WB
+# и L1-кэш данных поверх функционального эмулятора.
+#
+# Модель подключается как trace_hook и получает каждую выполненную команду,
+# поэтому семантика команд остаётся семантикой EmulatorMIPS. Для каждой
+# команды вычисляется такт стадии EX с учётом:
+#   - занятости стадии MEM предыдущей командой (промахи кэша останавливают конвейер);
+#   - перехода: после выполненного BEQ/BNE (решается в EX) и J (в ID)
+#     выборка начинается заново, предсказание — "переход не выполняется";
+#   - зависимостей по данным: с пробросом результат АЛУ доступен следующей
+#     команде сразу, результат LW — после MEM; без проброса операнды
+#     читаются из регистрового файла в ID не раньше такта WB источника.
+
+import argparse
+from collections import namedtuple
+
+from instructions import WRITES_RD, WRITES_RT
+
+# Параметры кэша: размер и строка в байтах, ассоциативность, политика замещения
+CacheConfig = namedtuple("CacheConfig", ["size", "line_size", "associativity", "policy", "miss_penalty"],
+                         defaults=(4096, 16, 2, "lru", 10))
+
+
+# Наборно-ассоциативный кэш данных с обратной записью и размещением при записи
+class Cache:
+    def __init__(self, config=CacheConfig()):
+        if config.policy not in ("lru", "fifo"):
+            raise ValueError(f"Неизвестная политика замещения: {config.policy}")
+        if config.size <= 0 or config.line_size <= 0 or config.associativity <= 0 or config.miss_penalty < 0:
+            raise ValueError("Размер, строка и ассоциативность кэша должны быть положительными")
+        lines = config.size // config.line_size
+        if config.line_size % 4 or lines < config.associativity or lines % config.associativity:
+            raise ValueError("Некорректная конфигурация кэша: строка кратна 4 байтам, "
+                             "число строк кратно ассоциативности")
+        self.config = config
+        self.set_count = lines // config.associativity
+        self.reset()
+
+    def reset(self):
+        # Для каждого набора — список тегов в порядке замещения (первый вытесняется)
+        # и множество грязных строк
+        self.sets = [[] for _ in range(self.set_count)]
+        self.dirty = set()
+        self.read_hits = self.read_misses = 0
+        self.write_hits = self.write_misses = 0
+        self.writebacks = 0
+
+    # Обращение к слову address; возвращает True при попадании
+    def access(self, address, write):
+        line = address * 4 // self.config.line_size
+        ways = self.sets[line % self.set_count]
+        hit = line in ways
+        if hit:
+            if self.config.policy == "lru":
+                ways.remove(line)
+                ways.append(line)
+        else:
+            if len(ways) == self.config.associativity:
+                victim = ways.pop(0)
+                if victim in self.dirty:
+                    self.dirty.discard(victim)
+                    self.writebacks += 1
+            ways.append(line)
+        if write:
+            self.dirty.add(line)
+            if hit:
+                self.write_hits += 1
+            else:
+                self.write_misses += 1
+        elif hit:
+            self.read_hits += 1
+        else:
+            self.read_misses += 1
+        return hit
+
+    def summary(self):
+        reads = self.read_hits + self.read_misses
+        writes = self.write_hits + self.write_misses
+        accesses = reads + writes
+        return {
+            "reads": reads, "read_hits": self.read_hits, "read_misses": self.read_misses,
+            "writes": writes, "write_hits": self.write_hits, "write_misses": self.write_misses,
+            "writebacks": self.writebacks,
+            "hit_rate": (self.read_hits + self.write_hits) / accesses if accesses else None,
+        }
+
+
+class TimingModel:
+    def __init__(self, forwarding=True, branch_penalty=2, jump_penalty=1, cache=CacheConfig()):
+        self.forwarding = forwarding
+        self.branch_penalty = branch_penalty  # такты после выполненного BEQ/BNE
+        self.jump_penalty = jump_penalty  # такты после J
+        self.cache = None if cache is None else Cache(cache)
+        self.reset()
+
+    def reset(self):
+        self.instructions = 0
+        self.stalls = {"data": 0, "load_use": 0, "control": 0, "memory": 0}
+        # Такт EX, с которого операнд-регистр доступен, и признак источника LW
+        self._ready = [0] * 32
+        self._from_load = [False] * 32
+        self._ex = 1  # такт EX предыдущей команды (первая команда — в такте 2)
+        self._mem_end = 1  # последний такт MEM предыдущей команды
+        self._redirect = 0  # самый ранний такт EX после перехода
+        self._last_wb = 0
+        if self.cache is not None:
+            self.cache.reset()
+
+    # Выполнение программы эмулятором с учётом времени; возвращает RunResult
+    def run(self, emulator, max_steps=None, max_time=None):
+        hook = emulator.trace_hook
+        emulator.trace_hook = self
+        try:
+            return emulator.run_until_halt(max_steps, max_time)
+        finally:
+            emulator.trace_hook = hook
+
+    # trace_hook: учёт команды entry, выполненной по адресу pc
+    def __call__(self, emulator, pc, entry, address):
+        name = entry.name
+        if name == "STOP":
+            return
+        if name in WRITES_RD:
+            sources, target = (entry.rs, entry.rt), entry.rd
+        elif name in WRITES_RT:
+            sources, target = (entry.rs,), entry.rt
+        elif name in ("SW", "BEQ", "BNE"):
+            sources, target = (entry.rs, entry.rt), None
+        else:
+            sources, target = (), None
+
+        # Такт EX без остановок и остановки по причинам в порядке их проверки
+        stalls = self.stalls
+        time = self._ex + 1
+        if self._mem_end > time:
+            stalls["memory"] += self._mem_end - time
+            time = self._mem_end
+        if self._redirect > time:
+            stalls["control"] += self._redirect - time
+            time = self._redirect
+        for register in sources:
+            ready = self._ready[register]
+            if ready > time:
+                stalls["load_use" if self._from_load[register] else "data"] += ready - time
+                time = ready
+
+        mem_end = time + 1
+        if address is not None and self.cache is not None:
+            if not self.cache.access(address, name == "SW"):
+                mem_end += self.cache.config.miss_penalty
+        wb = mem_end + 1
+
+        if target is not None:
+            if self.forwarding:
+                self._ready[target] = mem_end + 1 if name == "LW" else time + 1
+            else:
+                self._ready[target] = wb + 1
+            self._from_load[target] = name == "LW"
+        if name == "J":
+            self._redirect = time + 1 + self.jump_penalty
+        elif name in ("BEQ", "BNE") and emulator.pc != pc + 1:
+            self._redirect = time + 1 + self.branch_penalty
+        self._ex = time
+        self._mem_end = mem_end
+        self._last_wb = wb
+        self.instructions += 1
+
+    # Такты от выборки первой команды до записи результата последней
+    @property
+    def cycles(self):
+        return self._last_wb + 1 if self.instructions else 0
+
+    def summary(self):
+        result = {
+            "instructions": self.instructions,
+            "cycles": self.cycles,
+            "cpi": self.cycles / self.instructions if self.instructions else None,
+            "stalls": dict(self.stalls),
+            "forwarding": self.forwarding,
+        }
+        if self.cache is not None:
+            result["cache"] = self.cache.summary()
+        return result
+
+    def report(self):
+        summary = self.summary()
+        lines = [f"Команд: {summary['instructions']}, тактов: {summary['cycles']}"]
+        if summary["cpi"] is not None:
+            lines.append(f"CPI: {summary['cpi']:.3f}")
+        names = {"data": "зависимости по данным", "load_use": "загрузка-использование",
+                 "control": "переходы", "memory": "промахи кэша"}
+        for key, value in summary["stalls"].items():
+            lines.append(f"  остановки ({names[key]}): {value}")
+        cache = summary.get("cache")
+        if cache is not None and cache["hit_rate"] is not None:
+            lines.append(f"Кэш: чтений {cache['reads']} (промахов {cache['read_misses']}), "
+                         f"записей {cache['writes']} (промахов {cache['write_misses']}), "
+                         f"попаданий {100 * cache['hit_rate']:.1f}%, обратных записей {cache['writebacks']}")
+        return "\n".join(lines)
+
+
+# Разбор конфигурации кэша "size:line:ways[:policy[:penalty]]" для argparse;
+# конфигурация проверяется построением кэша
+def parse_cache(text):
+    parts = text.split(":")
+    try:
+        if not 3 <= len(parts) <= 5:
+            raise ValueError("Ожидается size:line:ways[:policy[:penalty]]")
+        values = [int(part, 0) for part in parts[:3]]
+        if len(parts) > 3:
+            values.append(parts[3].lower())
+        if len(parts) > 4:
+            values.append(int(parts[4], 0))
+        config = CacheConfig(*values)
+        Cache(config)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f"{text}: {error}") from None
+    return config
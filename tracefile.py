@@ -0,0 +1,244 @@
+# Двоичная трасса выполнения.
+#
+# Каждый шаг — запись фиксированного размера: pc, слово команды, записанный
+# регистр и его новое значение, адрес и значение слова памяти для LW/SW.
+# TraceWriter потоково пишет записи в файл блоками, RingTrace хранит только
+# последние N шагов в памяти. Оба подключаются как emulator.trace_hook.
+#
+#   python tracefile.py show run.trc --tail 20
+#   python tracefile.py diff good.trc bad.trc
+
+import argparse
+import sys
+from collections import namedtuple
+from struct import Struct
+
+from instructions import destination
+
+TRACE_MAGIC = b"MIPSTRC"
+TRACE_VERSION = 1
+
+# Заголовок: сигнатура, версия, номер первого шага в файле
+_HEADER = Struct("<7sBQ")
+# Запись: pc, слово команды, регистр (-1 — нет), его значение,
+# адрес памяти (-1 — нет), значение слова памяти
+_RECORD = Struct("<IIbxxxiii")
+RECORD_SIZE = _RECORD.size
+
+TraceRecord = namedtuple("TraceRecord", ["step", "pc", "word", "register", "value", "address", "memory_value"])
+
+# Поля записи для команды entry, выполненной по адресу pc
+def _fields(emulator, pc, entry, address):
+    registers = emulator.registers
+    register = destination(entry)
+    value = 0
+    memory_value = 0
+    if register is not None:
+        value = registers[register]
+        if address is not None:  # LW
+            memory_value = value
+    else:
+        register = -1
+        if address is not None:  # SW
+            memory_value = registers[entry.rt]
+    return (pc, emulator.instruction_memory[pc], register, value,
+            -1 if address is None else address, memory_value)
+
+
+# Потоковая запись трассы в файл; буфер сбрасывается каждые chunk_records шагов
+class TraceWriter:
+    def __init__(self, path, chunk_records=65536):
+        self.file = open(path, "wb")
+        self.file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, 0))
+        self.steps = 0
+        self._chunk_records = chunk_records
+        self._buffer = bytearray(chunk_records * RECORD_SIZE)
+        self._count = 0
+
+    def __call__(self, emulator, pc, entry, address):
+        _RECORD.pack_into(self._buffer, self._count * RECORD_SIZE, *_fields(emulator, pc, entry, address))
+        self._count += 1
+        self.steps += 1
+        if self._count == self._chunk_records:
+            self.flush()
+
+    def flush(self):
+        self.file.write(memoryview(self._buffer)[:self._count * RECORD_SIZE])
+        self._count = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Кольцевой буфер последних capacity шагов
+class RingTrace:
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("Размер кольцевого буфера должен быть положительным")
+        self.capacity = capacity
+        self.steps = 0
+        self._buffer = bytearray(capacity * RECORD_SIZE)
+
+    def __call__(self, emulator, pc, entry, address):
+        _RECORD.pack_into(self._buffer, (self.steps % self.capacity) * RECORD_SIZE,
+                          *_fields(emulator, pc, entry, address))
+        self.steps += 1
+
+    # Номер самого раннего сохранённого шага
+    @property
+    def first_step(self):
+        return max(0, self.steps - self.capacity)
+
+    # Сохранённые записи от старых к новым в виде байтов
+    def tobytes(self):
+        if self.steps <= self.capacity:
+            return bytes(self._buffer[:self.steps * RECORD_SIZE])
+        split = (self.steps % self.capacity) * RECORD_SIZE
+        return bytes(self._buffer[split:] + self._buffer[:split])
+
+    def records(self):
+        return _unpack(self.tobytes(), self.first_step)
+
+    # Запись содержимого буфера в файл трассы
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, self.first_step))
+            file.write(self.tobytes())
+
+
+def _unpack(data, first_step):
+    for index, fields in enumerate(_RECORD.iter_unpack(data)):
+        yield TraceRecord(first_step + index, *fields)
+
+
+# Открытие файла трассы: возвращает (файл, номер первого шага)
+def _open(path):
+    file = open(path, "rb")
+    header = file.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        file.close()
+        raise ValueError(f"Файл {path} не является трассой")
+    magic, version, first_step = _HEADER.unpack(header)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        file.close()
+        raise ValueError(f"Файл {path} не является трассой версии {TRACE_VERSION}")
+    return file, first_step
+
+
+# Блоки записей файла трассы: (номер первого шага блока, байты)
+def _chunks(path, chunk_records=65536, skip=0):
+    file, first_step = _open(path)
+    with file:
+        file.seek(skip * RECORD_SIZE, 1)
+        step = first_step + skip
+        while True:
+            data = file.read(chunk_records * RECORD_SIZE)
+            data = data[:len(data) - len(data) % RECORD_SIZE]
+            if not data:
+                return
+            yield step, data
+            step += len(data) // RECORD_SIZE
+
+
+# Чтение записей файла трассы
+def read_trace(path):
+    for step, data in _chunks(path):
+        yield from _unpack(data, step)
+
+
+def first_step(path):
+    file, step = _open(path)
+    file.close()
+    return step
+
+
+# Первый шаг, на котором трассы расходятся: (шаг, запись a, запись b) или None.
+# Трассы выравниваются по номерам шагов; если одна трасса закончилась раньше,
+# вместо её записи возвращается None. Блоки сравниваются как байты,
+# записи распаковываются только в месте расхождения
+def first_divergence(path_a, path_b):
+    start = max(first_step(path_a), first_step(path_b))
+    chunks_a = _chunks(path_a, skip=start - first_step(path_a))
+    chunks_b = _chunks(path_b, skip=start - first_step(path_b))
+    pending_a = pending_b = b""
+    step = start
+    while True:
+        if not pending_a:
+            pending_a = next(chunks_a, (None, b""))[1]
+        if not pending_b:
+            pending_b = next(chunks_b, (None, b""))[1]
+        if not pending_a and not pending_b:
+            return None
+        length = min(len(pending_a), len(pending_b))
+        if pending_a[:length] != pending_b[:length]:
+            index = next(i for i in range(0, length, RECORD_SIZE)
+                         if pending_a[i:i + RECORD_SIZE] != pending_b[i:i + RECORD_SIZE])
+            at = step + index // RECORD_SIZE
+            return (at, TraceRecord(at, *_RECORD.unpack_from(pending_a, index)),
+                    TraceRecord(at, *_RECORD.unpack_from(pending_b, index)))
+        if length == 0:
+            # Одна из трасс закончилась
+            record_a = TraceRecord(step, *_RECORD.unpack_from(pending_a)) if pending_a else None
+            record_b = TraceRecord(step, *_RECORD.unpack_from(pending_b)) if pending_b else None
+            return step, record_a, record_b
+        pending_a = pending_a[length:]
+        pending_b = pending_b[length:]
+        step += length // RECORD_SIZE
+
+
+def format_record(record):
+    if record is None:
+        return "<конец трассы>"
+    text = f"{record.step}: pc {record.pc} {record.word:#010x}"
+    if record.register >= 0:
+        text += f" R{record.register}={record.value}"
+    if record.address >= 0:
+        text += f" Mem[{record.address * 4}]={record.memory_value}"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Просмотр и сравнение двоичных трасс MIPS")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="вывод записей трассы")
+    show.add_argument("path")
+    show.add_argument("--tail", type=int, help="только последние N записей")
+    diff = commands.add_parser("diff", help="первый шаг, на котором трассы расходятся")
+    diff.add_argument("a")
+    diff.add_argument("b")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        skip = 0
+        if args.tail is not None:
+            file, _ = _open(args.path)
+            with file:
+                file.seek(0, 2)
+                total = (file.tell() - _HEADER.size) // RECORD_SIZE
+            skip = max(0, total - args.tail)
+        for step, data in _chunks(args.path, skip=skip):
+            for record in _unpack(data, step):
+                print(format_record(record))
+        return 0
+    divergence = first_divergence(args.a, args.b)
+    if divergence is None:
+        print("Трассы совпадают")
+        return 0
+    step, record_a, record_b = divergence
+    print(f"Расхождение на шаге {step}:")
+    print(f"  {args.a}: {format_record(record_a)}")
+    print(f"  {args.b}: {format_record(record_b)}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())